@@ -0,0 +1,78 @@
+"""Speed and parity of ImageMetrics / BatchImageMetrics against the per-metric classes of etl.image_quality.
+
+Usage, from app/:
+    python -m benchmarks.image_quality --images 50 --width 1920 --height 1080 --thumbnails 20000
+"""
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from etl.image_quality import Brightness, Blurriness, Entropy, AspectRatio, ImageMetrics, BatchImageMetrics
+
+
+def legacy_metrics(img):
+    # The body of calculate_metrics before the fused engine.
+    return {
+        "dark_score": Brightness.calculate_brightness_score(img)['brightness_perc_95'],
+        "light_score": 1 - Brightness.calculate_brightness_score(img)['brightness_perc_5'],
+        "low_information_score": Entropy.calc_entropy_score(img),
+        "blur_score": Blurriness.calculate_blurriness_score(img),
+        "aspect_ratio_score": AspectRatio.calc_aspect_ratio_score(img),
+    }
+
+
+def make_images(count, width, height, mode):
+    rng = np.random.default_rng(0)
+    images = []
+    for i in range(count):
+        # Smooth gradients plus noise, closer to real frames than pure noise.
+        base = np.linspace(0, 255 * rng.random(), width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 20 + i % 40, (height, width, 3)).astype(np.float32)
+        images.append(Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8)).convert(mode))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--thumbnails", type=int, default=20000)
+    args = parser.parse_args()
+
+    for mode in ["RGB", "L"]:
+        images = make_images(args.images, args.width, args.height, mode)
+
+        start = time.perf_counter()
+        legacy = [legacy_metrics(img) for img in images]
+        legacy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fused = [ImageMetrics.calculate(img) for img in images]
+        fused_s = time.perf_counter() - start
+
+        print(f"{mode}: legacy {1000 * legacy_s / len(images):.1f} ms/img, "
+              f"fused {1000 * fused_s / len(images):.1f} ms/img, speedup x{legacy_s / fused_s:.1f}")
+        for key in legacy[0]:
+            diff = max(abs(float(a[key]) - float(b[key])) for a, b in zip(legacy, fused))
+            print(f"  max |diff| {key:<22} {diff:.2e}")
+
+    thumbnails = np.stack([np.asarray(img) for img in make_images(64, 64, 64, "RGB")])
+    thumbnails = thumbnails[np.arange(args.thumbnails) % len(thumbnails)]
+    start = time.perf_counter()
+    batch = BatchImageMetrics.calculate(thumbnails)
+    batch_s = time.perf_counter() - start
+    sample = [Image.fromarray(thumbnail) for thumbnail in thumbnails[:1000]]
+    start = time.perf_counter()
+    loop = [ImageMetrics.calculate(img) for img in sample]
+    loop_s = (time.perf_counter() - start) * len(thumbnails) / len(sample)
+    print(f"{args.thumbnails} 64x64 thumbnails: batch {batch_s:.2f}s, "
+          f"per-image loop {loop_s:.2f}s (extrapolated), speedup x{loop_s / batch_s:.1f}")
+    diff = max(abs(batch[key][:len(loop)] - np.array([m[key] for m in loop])).max() for key in BatchImageMetrics.FIELDS)
+    print(f"  max |diff| vs ImageMetrics.calculate {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
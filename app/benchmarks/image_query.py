@@ -0,0 +1,91 @@
+"""Curation queries on the image table: JSONB expressions vs the indexed generated columns.
+
+Fills a synthetic `image` table in a separate `bench` schema of the docker-compose Postgres
+(Config.database), then times the same filter written against the raw JSONB and through
+database.image_query.find_images. Usage, from app/:
+    python -m benchmarks.image_query --rows 1000000
+"""
+import time
+import argparse
+
+from sqlalchemy import text #type: ignore
+from sqlalchemy.orm import Session #type: ignore
+
+import database.models as models
+from database.database import engine
+from database.image_query import find_images
+
+SCHEMA = "bench"
+
+FILL = """
+INSERT INTO image ("Id_Image", "URL", "Description", "Meta_data", "Metric")
+SELECT md5(i::text)::uuid,
+       '/bench/' || i || '.jpg',
+       NULL,
+       jsonb_build_object('task', 'task_' || (i % :tasks),
+                          'date_time', (timestamp '2024-01-01' + i * interval '30 seconds')::text,
+                          'local_path', '/data/' || i || '.jpg',
+                          'size', '1920x1080'),
+       jsonb_build_object('dark_score', random(), 'light_score', random(), 'blur_score', random(),
+                          'low_information_score', random(), 'aspect_ratio_score', 1.0, 'brightness', random())
+FROM generate_series(:start, :stop - 1) AS i
+"""
+
+RAW_JSONB = """
+SELECT "Id_Image" FROM image
+WHERE "Meta_data"->>'task' = :task AND ("Metric"->>'dark_score')::double precision >= :dark
+ORDER BY "Id_Image" LIMIT :limit
+"""
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    bench = engine.execution_options(schema_translate_map={None: SCHEMA})
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {SCHEMA}.image CASCADE"))
+    models.Image.__table__.create(bench)
+
+    start = time.perf_counter()
+    step = 100_000
+    with bench.begin() as conn:
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        for offset in range(0, args.rows, step):
+            conn.execute(text(FILL), {"tasks": args.tasks, "start": offset, "stop": min(offset + step, args.rows)})
+        conn.execute(text("ANALYZE image"))
+    print(f"Filled {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+    params = {"task": "task_3", "dark": 0.8, "limit": args.limit}
+    with bench.connect() as conn, Session(bind=bench) as session:
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        cases = {
+            "JSONB expressions": lambda: conn.execute(text(RAW_JSONB), params).all(),
+            "generated columns": lambda: find_images(session, task="task_3", min_scores={"dark_score": 0.8}, limit=args.limit),
+            "GIN containment": lambda: find_images(session, meta_contains={"task": "task_3"},
+                                                   min_scores={"dark_score": 0.8}, limit=args.limit),
+        }
+        for name, fn in cases.items():
+            seconds, count = timed(fn, args.repeat)
+            print(f"{name:<20} {seconds * 1000:9.1f} ms ({count} rows)")
+
+        plan = conn.execute(text("EXPLAIN " + RAW_JSONB), params).scalars().all()
+        print("JSONB expressions plan:", plan[0].strip())
+
+
+if __name__ == "__main__":
+    main()
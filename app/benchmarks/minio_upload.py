@@ -0,0 +1,63 @@
+"""Upload throughput of MinioClientWrapper: sequential upload_object vs upload_many.
+
+Runs against the local MinIO of docker-compose.yml (Config.minio). Usage, from app/:
+    python -m benchmarks.minio_upload --files 200 --size-kb 300 --workers 1 8 16
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from configure import Config
+from storage.minio_storage import MinioClientWrapper
+
+
+def make_files(directory, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"frame_{i:06d}.jpg")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def report(name, seconds, count, total_bytes):
+    print(f"{name:<28} {count / seconds:8.1f} obj/s {total_bytes / seconds / 2**20:8.1f} MiB/s ({seconds:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--bucket", default="bench-upload")
+    args = parser.parse_args()
+
+    client = MinioClientWrapper(Config.minio.MINIO_DOMAIN, Config.minio.MINIO_USER, Config.minio.MINIO_PASSWORD)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_files(directory, args.files, args.size_kb * 1024)
+        total_bytes = args.files * args.size_kb * 1024
+
+        start = time.perf_counter()
+        for path in paths:
+            client.upload_object(args.bucket, "sequential/" + os.path.basename(path), path)
+        report("upload_object (sequential)", time.perf_counter() - start, args.files, total_bytes)
+
+        for workers in args.workers:
+            prefix = f"parallel-{workers}/"
+            start = time.perf_counter()
+            results = client.upload_directory(args.bucket, directory, prefix=prefix, max_workers=workers)
+            report(f"upload_directory x{workers}", time.perf_counter() - start, args.files, total_bytes)
+            failed = [r for r in results if r["status"] == "failed"]
+            if failed:
+                print(f"  {len(failed)} failed, e.g. {failed[0]['error']}")
+
+        start = time.perf_counter()
+        results = client.upload_directory(args.bucket, directory, prefix=prefix, max_workers=args.workers[-1])
+        skipped = sum(r["status"] == "skipped" for r in results)
+        report(f"re-upload, {skipped} skipped", time.perf_counter() - start, args.files, total_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Nuclio invocation throughput: session per call vs pooled LambdaGateway vs AsyncLambdaGateway.
+
+Runs against the local stub of benchmarks.nuclio_stub. Usage, from app/:
+    python -m benchmarks.nuclio_gateway --calls 500 --delay-ms 20 --in-flight 16
+"""
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.nuclio_stub import start_stub, load_invoke_serverless
+
+PAYLOAD = {"image": "x" * 1024}
+
+
+def report(name, calls, seconds):
+    print(f"{name:<34} {calls / seconds:9.1f} calls/s ({seconds:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--in-flight", type=int, default=16)
+    args = parser.parse_args()
+
+    invoke_serverless = load_invoke_serverless()
+    server, url = start_stub(delay=args.delay_ms / 1000)
+    gateway = invoke_serverless.LambdaGateway(gateway_url=url)
+    func = invoke_serverless.LambdaFunction(gateway, "stub-detector")
+    invocation_url = url + "/api/function_invocations"
+
+    def session_per_call(_):
+        with requests.Session() as session:
+            session.post(invocation_url, json=PAYLOAD, headers=dict(gateway.headers)).raise_for_status()
+
+    start = time.perf_counter()
+    for i in range(args.calls):
+        session_per_call(i)
+    report("session per call, serial", args.calls, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        gateway.invoke(func, PAYLOAD)
+    report("pooled gateway, serial", args.calls, time.perf_counter() - start)
+
+    with ThreadPoolExecutor(args.threads) as executor:
+        start = time.perf_counter()
+        list(executor.map(session_per_call, range(args.calls)))
+        report(f"session per call, {args.threads} threads", args.calls, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        list(executor.map(lambda _: gateway.invoke(func, PAYLOAD), range(args.calls)))
+        report(f"pooled gateway, {args.threads} threads", args.calls, time.perf_counter() - start)
+
+    async def run_async():
+        async with invoke_serverless.AsyncLambdaGateway(gateway_url=url, max_connections=args.in_flight) as agw:
+            start = time.perf_counter()
+            await asyncio.gather(*(agw.invoke(func, PAYLOAD) for _ in range(args.calls)))
+            report(f"async gateway, {args.in_flight} in flight", args.calls, time.perf_counter() - start)
+
+    asyncio.run(run_async())
+    gateway.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Auto-labelling throughput through Nuclio: serial LambdaFunction.invoke vs invoke_many.
+
+Runs against the local stub of benchmarks.nuclio_stub, which fails every `--fail-every`th
+invocation with a 503 so that the retries are exercised. Usage, from app/:
+    python -m benchmarks.nuclio_invoke_many --images 300 --delay-ms 20 --concurrency 4 16
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.nuclio_stub import start_stub, load_invoke_serverless
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--delay-ms", type=float, default=20.0)
+    parser.add_argument("--fail-every", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16])
+    args = parser.parse_args()
+
+    invoke_serverless = load_invoke_serverless()
+    server, url = start_stub(delay=args.delay_ms / 1000, fail_every=args.fail_every)
+    gateway = invoke_serverless.LambdaGateway(gateway_url=url)
+    func = invoke_serverless.LambdaFunction(gateway, "stub-detector")
+    image = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+
+    def images():
+        for _ in range(args.images):
+            yield image
+
+    start = time.perf_counter()
+    failed = 0
+    for item in images():
+        try:
+            func.invoke({"image": item})
+        except Exception:
+            failed += 1
+    seconds = time.perf_counter() - start
+    print(f"{'serial invoke':<28} {args.images / seconds:7.1f} images/s ({failed} failed)")
+
+    for ordered in (False, True):
+        for concurrency in args.concurrency:
+            results = list(func.invoke_many(images(), concurrency=concurrency, ordered=ordered))
+            failed = sum(error is not None for _, _, error in results)
+            in_order = [index for index, _, _ in results] == list(range(args.images))
+            name = f"invoke_many x{concurrency}{' ordered' if ordered else ''}"
+            print(f"{name:<28} {func.stats['items_per_sec']:7.1f} images/s ({failed} failed, "
+                  f"in order: {in_order}) {json.dumps({k: v for k, v in func.stats.items() if k.endswith('_ms')})}")
+
+    gateway.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Client-side preprocessing profiles on 4K frames: bytes sent, client encode and server decode time.
+
+Usage, from app/:
+    python -m benchmarks.nuclio_profiles --width 3840 --height 2160 --repeat 10
+"""
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from benchmarks.nuclio_stub import load_invoke_serverless
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    invoke_serverless = load_invoke_serverless()
+    ImageProfile = invoke_serverless.ImageProfile
+    x = np.linspace(0, 255, args.width, dtype=np.float32)
+    y = np.linspace(0, 255, args.height, dtype=np.float32)[:, None]
+    image = np.dstack([x + 0 * y, y + 0 * x, (x + y) / 2]).astype(np.uint8)
+    image = cv2.GaussianBlur(cv2.add(image, np.random.default_rng(0).integers(0, 40, image.shape, dtype=np.uint8)), (5, 5), 0)
+
+    profiles = {
+        "full frame, JPEG default": ImageProfile(),
+        "CLIP 224, JPEG 90": invoke_serverless.PROFILES["extract-image-features"],
+        "YOLO 640, JPEG 90": invoke_serverless.PROFILES["detect-ads"],
+        "YOLO 640, WebP 80": ImageProfile(max_side=640, encode_format=".webp", quality=80),
+        "YOLO 640, PNG 1": ImageProfile(max_side=640, encode_format=".png", quality=1),
+    }
+    for name, profile in profiles.items():
+        encode, (data, _) = best_of(lambda: profile.prepare(image), args.repeat)
+        buffer = np.frombuffer(data, np.uint8)
+        decode, _ = best_of(lambda: cv2.imdecode(buffer, cv2.IMREAD_COLOR), args.repeat)
+        print(f"{name:<26} {len(data) / 1024:8.1f} KiB  encode {encode * 1000:6.1f} ms  decode {decode * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Cost of creating LambdaFunction handles: a spec fetch per handle vs the shared FunctionRegistry.
+
+Runs against the local stub of benchmarks.nuclio_stub, which counts the dashboard requests.
+Usage, from app/:
+    python -m benchmarks.nuclio_registry --handles 1000
+"""
+import time
+import argparse
+
+from benchmarks.nuclio_stub import start_stub, load_invoke_serverless
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handles", type=int, default=1000)
+    parser.add_argument("--ttl", type=float, default=0.1)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    invoke_serverless = load_invoke_serverless()
+    server, url = start_stub()
+    handler = server.RequestHandlerClass
+    gateway = invoke_serverless.LambdaGateway(gateway_url=url)
+    FunctionRegistry = invoke_serverless.FunctionRegistry
+
+    def create(name, registry_factory):
+        handler.spec_requests = 0
+        start = time.perf_counter()
+        for _ in range(args.handles):
+            invoke_serverless.LambdaFunction(gateway, "stub-detector", registry=registry_factory())
+        seconds = time.perf_counter() - start
+        print(f"{name:<32} {seconds / args.handles * 1e6:9.1f} us/handle  {handler.spec_requests} dashboard requests")
+
+    create("fetch per handle", lambda: FunctionRegistry(gateway))
+    create("shared registry", lambda: None)
+    # Handles keep being created while the spec expires: refreshes happen off the caller's path.
+    registry = FunctionRegistry(gateway, ttl=args.ttl)
+    invoke_serverless.LambdaFunction(gateway, "stub-detector", registry=registry)
+    handler.spec_requests = 0
+    slowest, handles = 0.0, 0
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        invoke_serverless.LambdaFunction(gateway, "stub-detector", registry=registry)
+        slowest = max(slowest, time.perf_counter() - start)
+        handles += 1
+        time.sleep(0.001)
+    print(f"ttl {args.ttl}s for {args.seconds}s: {handles} handles, slowest {slowest * 1e6:.0f} us, "
+          f"{handler.spec_requests} background refreshes")
+
+    gateway.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Stub of the Nuclio dashboard API for client benchmarks: function specs and invocations.
+
+Invocations decode the image with the handlers' decode_request (JSON with a base64 image, a raw
+image body or msgpack), sleep `delay` seconds, stand-ins for model inference, and answer with an
+empty detection list; with `fail_every=N` every Nth invocation answers 503 instead. Used by the benchmarks.nuclio_* scripts.
+"""
+import json
+import time
+import threading
+import importlib.util
+from pathlib import Path
+from types import SimpleNamespace
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from serverless.common.transport import decode_request
+
+FUNCTION_SPEC = {
+    "metadata": {
+        "name": "stub-detector",
+        "annotations": {
+            "type": "detector",
+            "name": "Stub detector",
+            "spec": json.dumps([{"name": "person"}, {"name": "car"}]),
+        },
+    },
+    "spec": {"description": "Stub function for benchmarks"},
+}
+
+
+def load_invoke_serverless():
+    """Import app/invoke-serverless.py, whose file name is not a valid module name."""
+    path = Path(__file__).resolve().parent.parent / "invoke-serverless.py"
+    spec = importlib.util.spec_from_file_location("invoke_serverless", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real dashboard
+    disable_nagle_algorithm = True
+    delay = 0.0
+    fail_every = 0
+    received_bytes = 0
+    invocations = 0
+    spec_requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.spec_requests += 1
+        if self.path.rstrip("/").endswith("/api/functions"):
+            self._reply({FUNCTION_SPEC["metadata"]["name"]: FUNCTION_SPEC})
+        else:
+            self._reply(FUNCTION_SPEC)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        cls = type(self)
+        with cls.lock:
+            cls.received_bytes += len(body)
+            cls.invocations += 1
+            fail = self.fail_every and cls.invocations % self.fail_every == 0
+        decode_request(SimpleNamespace(headers=dict(self.headers), body=body))
+        if self.delay:
+            time.sleep(self.delay)
+        if fail:
+            self._reply({"error": "function is scaling"}, status=503)
+        else:
+            self._reply([])
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 resets connections under load
+
+
+def start_stub(delay=0.0, port=0, fail_every=0):
+    """Serve the stub in a background thread; returns (server, base_url)."""
+    handler = type("Handler", (StubHandler,), {"delay": delay, "fail_every": fail_every, "lock": threading.Lock()})
+    server = StubServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
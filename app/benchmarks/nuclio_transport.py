@@ -0,0 +1,51 @@
+"""Invocation body size and latency of the json, binary and msgpack transports of LambdaFunction.
+
+Runs against the local stub of benchmarks.nuclio_stub, which decodes every body like the
+function handlers do. Usage, from app/:
+    python -m benchmarks.nuclio_transport --images 200 --width 1920 --height 1080
+"""
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from benchmarks.nuclio_stub import start_stub, load_invoke_serverless
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+
+    invoke_serverless = load_invoke_serverless()
+    server, url = start_stub()
+    handler = server.RequestHandlerClass
+    gateway = invoke_serverless.LambdaGateway(gateway_url=url)
+    # A smooth synthetic frame compresses like a photo; pure noise would not.
+    x = np.linspace(0, 255, args.width, dtype=np.float32)
+    y = np.linspace(0, 255, args.height, dtype=np.float32)[:, None]
+    image = np.dstack([x + 0 * y, y + 0 * x, (x + y) / 2]).astype(np.uint8)
+    image = cv2.GaussianBlur(cv2.add(image, np.random.default_rng(0).integers(0, 40, image.shape, dtype=np.uint8)), (5, 5), 0)
+
+    for transport in invoke_serverless.TRANSPORTS:
+        func = invoke_serverless.LambdaFunction(gateway, "stub-detector", transport=transport)
+        func.invoke({"image": image, "threshold": 0.5})  # warm-up
+        handler.received_bytes = handler.invocations = 0
+        latencies = []
+        for _ in range(args.images):
+            start = time.perf_counter()
+            func.invoke({"image": image, "threshold": 0.5})
+            latencies.append(time.perf_counter() - start)
+        stats = invoke_serverless.latency_percentiles(latencies)
+        print(f"{transport:<8} {handler.received_bytes / handler.invocations / 1024:8.1f} KiB/request  "
+              f"p50 {stats['p50_ms']:6.1f} ms  p90 {stats['p90_ms']:6.1f} ms")
+
+    gateway.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,11 @@ class DatabaseConfig:
     PORT_DATABASE = os.environ.get("PORT_DATABASE", "5412")
     NAME_DATABASE = os.environ.get("NAME_DATABASE", "data-recall-system")
     URL_DATABASE = f"postgresql://{USER_DATABASE}:{PASSWORD_DATABASE}@{HOST_DATABASE}:{PORT_DATABASE}/{NAME_DATABASE}"
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 60000))
 
 class MinIOConfig:
     MINIO_DOMAIN = "localhost"
@@ -44,6 +49,10 @@ class BrokerConfig:
 class QdrantConfig:
     QDRANT_HOST = os.environ.get("QDRANT_HOST", "localhost")
     QDRANT_PORT = os.environ.get("QDRANT_PORT", 6333)
+    QDRANT_GRPC_PORT = int(os.environ.get("QDRANT_GRPC_PORT", 6334))
+    QDRANT_FLUSH_POINTS = int(os.environ.get("QDRANT_FLUSH_POINTS", 1024))
+    QDRANT_FLUSH_SECONDS = float(os.environ.get("QDRANT_FLUSH_SECONDS", 5.0))
+    QDRANT_UPLOAD_PARALLEL = int(os.environ.get("QDRANT_UPLOAD_PARALLEL", 1))
     
 class NuclioConfig:
     NUCLIO_SCHEME = os.environ.get("NUCLIO_SCHEME", "http")
@@ -51,6 +60,17 @@ class NuclioConfig:
     NUCLIO_PORT = os.environ.get("NUCLIO_PORT", 8071)
     NUCLIO_FUNCTION_NAMESPACE = os.environ.get("NUCLIO_FUNCTION_NAMESPACE", "nuclio")
     NUCLIO_DEFAULT_TIMEOUT = os.environ.get("NUCLIO_DEFAULT_TIMEOUT", 120)
+    NUCLIO_POOL_MAXSIZE = int(os.environ.get("NUCLIO_POOL_MAXSIZE", 64))
+    NUCLIO_MAX_RETRIES = int(os.environ.get("NUCLIO_MAX_RETRIES", 3))
+    NUCLIO_RETRY_BACKOFF = float(os.environ.get("NUCLIO_RETRY_BACKOFF", 0.5))
+    # Request body of invocations: "json" (base64 image, understood by every function), "binary" or "msgpack"
+    NUCLIO_TRANSPORT = os.environ.get("NUCLIO_TRANSPORT", "json")
+    # Seconds a parsed function spec is served before it is refreshed in the background
+    NUCLIO_SPEC_TTL = float(os.environ.get("NUCLIO_SPEC_TTL", 300))
+
+class PipelineConfig:
+    QUALITY_WORKERS = int(os.environ.get("QUALITY_WORKERS", 2))
+    DB_BATCH_ROWS = int(os.environ.get("DB_BATCH_ROWS", 1000))
 
 class CvatConfig:
     CVAT_DOMAIN = os.environ.get("CVAT_DOMAIN", "https://www.cvat.ai/")
@@ -64,4 +84,5 @@ class Config:
     broker = BrokerConfig()
     nuclio = NuclioConfig()
     qdrant = QdrantConfig()
-    cvat = CvatConfig()
\ No newline at end of file
+    cvat = CvatConfig()
+    pipeline = PipelineConfig()
\ No newline at end of file
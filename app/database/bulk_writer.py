@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+import time
+import uuid
+import threading
+
+from sqlalchemy import inspect, select #type: ignore
+from sqlalchemy.dialects.postgresql import JSONB #type: ignore
+
+import database.models as models
+from database.database import engine as default_engine
+
+
+class BulkWriter:
+    """Buffers Image and Annotation rows and writes them in large batches.
+
+    Rows are plain dicts keyed by the model attribute names (`id`, `url`, `meta_data`, ...).
+    Once `batch_rows` rows are buffered they are written in one transaction, images before
+    annotations, either with an executemany INSERT (`method="insert"`) or with
+    `COPY ... FROM STDIN` (`method="copy"`, psycopg2 only).
+    """
+    def __init__(self, engine=None, batch_rows=1000, method="insert"):
+        if method not in ("insert", "copy"):
+            raise ValueError("method must be 'insert' or 'copy'")
+        self.engine = engine if engine is not None else default_engine
+        self.batch_rows = batch_rows
+        self.method = method
+        self._rows = {models.Image: [], models.Annotation: []}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self.rows_written = 0
+        self.seconds = 0.0
+
+    def add_image(self, **values):
+        self._add(models.Image, values)
+
+    def add_annotation(self, **values):
+        self._add(models.Annotation, values)
+
+    def _add(self, model, values):
+        values.setdefault("id", uuid.uuid4())
+        # Table columns are keyed by their database names ("Id_Image"), not the attribute names.
+        columns = inspect(model).columns
+        row = {columns[key].key: value for key, value in values.items()}
+        with self._lock:
+            self._rows[model].append(row)
+            due = sum(len(rows) for rows in self._rows.values()) >= self.batch_rows
+        if due:
+            self.flush()
+
+    def label_id(self, class_name):
+        """Id of the Label named `class_name`, created if missing and cached for the writer's lifetime."""
+        if class_name not in self._labels:
+            label = models.Label
+            with self.engine.begin() as conn:
+                found = conn.execute(select(label.id).where(label.class_name == class_name)).first()
+                if found is None:
+                    label_id = uuid.uuid4()
+                    columns = inspect(label).columns
+                    conn.execute(label.__table__.insert(),
+                                 [{columns["id"].key: label_id, columns["class_name"].key: class_name}])
+                else:
+                    label_id = found[0]
+            self._labels[class_name] = label_id
+        return self._labels[class_name]
+
+    def flush(self):
+        with self._lock:
+            batches = [(model, rows) for model, rows in self._rows.items() if rows]
+            self._rows = {model: [] for model in self._rows}
+        if not batches:
+            return
+        start = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                for model, rows in batches:
+                    if self.method == "copy":
+                        self._copy(conn, model.__table__, rows)
+                    else:
+                        conn.execute(model.__table__.insert(), rows)
+        except Exception:
+            # Put the rows back so the next flush retries them.
+            with self._lock:
+                for model, rows in batches:
+                    self._rows[model] = rows + self._rows[model]
+            raise
+        self.seconds += time.perf_counter() - start
+        self.rows_written += sum(len(rows) for _, rows in batches)
+
+    def _copy(self, conn, table, rows):
+        # Generated columns (Dark_Score, Task, ...) are computed by Postgres and cannot be copied into.
+        columns = [column for column in table.columns if column.computed is None]
+        buffer = io.StringIO()
+        # NULL is sent as an unquoted \N so that empty strings stay empty strings.
+        writer = csv.writer(buffer)
+        for row in rows:
+            record = []
+            for column in columns:
+                value = row.get(column.key)
+                if value is None:
+                    record.append("\\N")
+                elif isinstance(column.type, JSONB):
+                    record.append(json.dumps(value))
+                else:
+                    record.append(str(value))
+            writer.writerow(record)
+        buffer.seek(0)
+        names = ", ".join(f'"{column.name}"' for column in columns)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f'COPY "{table.name}" ({names}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')', buffer)
+
+    def report(self):
+        return {
+            "rows": self.rows_written,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows_written / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+    def close(self):
+        self.flush()
+        print(f"Bulk writer report: {json.dumps(self.report())}")
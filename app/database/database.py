@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from sqlalchemy import create_engine #type: ignore
 from sqlalchemy.orm import declarative_base #type: ignore
 from sqlalchemy.orm import sessionmaker #type: ignore
@@ -6,8 +8,45 @@ from configure import Config
 
 config = Config()
 URL_DATABASE = Config.database.URL_DATABASE
-engine = create_engine(URL_DATABASE)
+
+def create_pooled_engine(url=URL_DATABASE, pool_size=None, max_overflow=None, statement_timeout_ms=None):
+    """Engine with a bounded connection pool shared by every session of the process.
+
+    Connections are checked with a ping before use and recycled after DB_POOL_RECYCLE seconds, so a
+    long-running worker survives Postgres restarts and idle timeouts. Every statement is limited
+    to DB_STATEMENT_TIMEOUT_MS (0 disables the limit).
+    """
+    db = Config.database
+    statement_timeout_ms = db.DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    return create_engine(
+        url,
+        pool_size=db.DB_POOL_SIZE if pool_size is None else pool_size,
+        max_overflow=db.DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        pool_timeout=db.DB_POOL_TIMEOUT,
+        pool_recycle=db.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"options": f"-c statement_timeout={statement_timeout_ms}"},
+    )
+
+engine = create_pooled_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+@contextmanager
+def session_scope():
+    """Session for one task or worker: committed on success, rolled back on error, always closed.
+
+    The connection goes back to the pool on exit, so workers can open a scope per unit of work
+    without opening a new connection each time.
+    """
+    session = SessionLocal()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
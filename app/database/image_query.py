@@ -0,0 +1,64 @@
+from sqlalchemy import inspect, select, text #type: ignore
+
+import database.models as models
+
+# Scores that can be filtered with min_scores / max_scores, all backed by an indexed generated column.
+SCORE_COLUMNS = ("dark_score", "light_score", "blur_score", "low_information_score")
+
+
+def upgrade_image_table(engine):
+    """Add the generated columns and indexes of models.Image to an `image` table created before them.
+
+    `Base.metadata.create_all` never alters an existing table. Existing rows are filled in by
+    Postgres while the columns are added. Safe to run again.
+    """
+    table = models.Image.__table__
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.computed is None or column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(text(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type} '
+                f'GENERATED ALWAYS AS ({column.computed.sqltext}) STORED'
+            ))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+        conn.execute(text(f'ANALYZE "{table.name}"'))
+
+
+def _score_column(name):
+    if name not in SCORE_COLUMNS:
+        raise ValueError(f"Unknown score {name!r}, expected one of {SCORE_COLUMNS}")
+    return getattr(models.Image, name)
+
+
+def find_images(session, task=None, date_from=None, date_to=None, min_scores=None, max_scores=None,
+                meta_contains=None, limit=1000, after_id=None):
+    """Images matching the filters, ordered by id.
+
+    `min_scores` / `max_scores` map a name of SCORE_COLUMNS to a bound, e.g.
+    `find_images(db, task="test", min_scores={"dark_score": 0.8})`. Scores, `task` and the
+    `date_time` range ("YYYY-MM-DD HH:MM:SS" strings) are matched on the indexed generated columns,
+    `meta_contains` on the GIN index of Meta_data (JSONB containment). Pass the last id of a page
+    as `after_id` to get the next one.
+    """
+    image = models.Image
+    query = select(image)
+    if task is not None:
+        query = query.where(image.task == task)
+    if date_from is not None:
+        query = query.where(image.date_time >= str(date_from))
+    if date_to is not None:
+        query = query.where(image.date_time < str(date_to))
+    for name, bound in (min_scores or {}).items():
+        query = query.where(_score_column(name) >= bound)
+    for name, bound in (max_scores or {}).items():
+        query = query.where(_score_column(name) <= bound)
+    if meta_contains:
+        query = query.where(image.meta_data.contains(meta_contains))
+    if after_id is not None:
+        query = query.where(image.id > after_id)
+    query = query.order_by(image.id).limit(limit)
+    return session.execute(query).scalars().all()
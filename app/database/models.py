@@ -1,13 +1,24 @@
-from sqlalchemy import create_engine, ForeignKey, Boolean, Column, Integer, String, DateTime, Float
+from sqlalchemy import create_engine, ForeignKey, Boolean, Column, Computed, Index, Integer, UniqueConstraint, BigInteger, String, DateTime, Float
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship, declarative_base, sessionmaker
 from database.database import Base
 import uuid
 
+def _metric_score(key):
+    return Computed(f"(\"Metric\"->>'{key}')::double precision", persisted=True)
+
+def _meta_text(key):
+    return Computed(f"\"Meta_data\"->>'{key}'", persisted=True)
+
 class Image(Base):
     __tablename__ = 'image'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        Index('ix_image_metric_gin', 'Metric', postgresql_using='gin', postgresql_ops={'Metric': 'jsonb_path_ops'}),
+        Index('ix_image_meta_data_gin', 'Meta_data', postgresql_using='gin', postgresql_ops={'Meta_data': 'jsonb_path_ops'}),
+        Index('ix_image_task_date_time', 'Task', 'Date_Time'),
+        {'extend_existing': True},
+    )
     
     id = Column('Id_Image', UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     url = Column('URL', String)
@@ -15,9 +26,32 @@ class Image(Base):
     meta_data = Column('Meta_data', JSONB, nullable=True)
     metric = Column('Metric', JSONB, nullable=True)
 
+    # Cột sinh tự động (STORED) từ các khóa hay lọc của Metric/Meta_data, có index để lọc không cần parse JSON
+    dark_score = Column('Dark_Score', Float, _metric_score('dark_score'), index=True)
+    light_score = Column('Light_Score', Float, _metric_score('light_score'), index=True)
+    blur_score = Column('Blur_Score', Float, _metric_score('blur_score'), index=True)
+    low_information_score = Column('Low_Information_Score', Float, _metric_score('low_information_score'), index=True)
+    task = Column('Task', String, _meta_text('task'))
+    date_time = Column('Date_Time', String, _meta_text('date_time'), index=True)  # Chuỗi "YYYY-MM-DD HH:MM:SS", so sánh theo thứ tự chuỗi
+
     annotations = relationship('Annotation', back_populates='image')  # Quan hệ với bảng annotations
     imagedatasets = relationship('ImageDataset', back_populates='image')
 
+class ImageHash(Base):
+    __tablename__ = 'image_hash'
+    __table_args__ = (
+        UniqueConstraint('Image_Id', 'Sha256', 'Local_Path', name='uq_image_hash_image_sha256_path'),
+        {'extend_existing': True},
+    )
+
+    id = Column('Id_ImageHash', UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    image_id = Column('Image_Id', UUID(as_uuid=True), nullable=False, index=True)  # Ảnh gốc đã được ingest
+    sha256 = Column('Sha256', String(64), nullable=False, index=True)
+    phash = Column('Phash', BigInteger, nullable=False)
+    local_path = Column('Local_Path', String, nullable=True)
+    is_duplicate = Column('Is_Duplicate', Boolean, nullable=False, default=False)  # File trùng được liên kết tới ảnh gốc
+    distance = Column('Distance', Integer, nullable=False, default=0)
+
 class Annotation(Base):  
     __tablename__ = 'annotations'  
     __table_args__ = {'extend_existing': True}
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+from urllib.parse import unquote
+
+from PIL import Image
+from sqlalchemy import select #type: ignore
+
+import database.models as models
+from database.database import engine as default_engine
+from utils.utils import convertToYolo
+
+
+def split_path_object(url):
+    """Inverse of MinioClientWrapper.get_path_object: "/bucket/name" -> (bucket, name)."""
+    bucket_name, object_name = url.lstrip("/").split("/", 1)
+    return bucket_name, unquote(object_name)
+
+
+def parse_size(meta_data):
+    """(width, height) from the "WxH" size stored in Meta_data at ingestion, or None."""
+    try:
+        width, height = (meta_data or {})["size"].split("x")
+        return int(width), int(height)
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+class DatasetExporter:
+    """Streams the images of a Dataset with their annotations out as YOLO or COCO training files.
+
+    Images are read in keyset pages (`Id_Image > last id`, ordered by id), so every page is a short
+    query whatever the dataset size, and the annotations of a page come in one more query read
+    through a server-side cursor. Image files of a page are fetched from MinIO in parallel and
+    written out before the next page is read, so memory stays bounded by `page_size`.
+    """
+    def __init__(self, minio_client, engine=None, page_size=500, fetch_workers=8):
+        self.minio_client = minio_client
+        self.engine = engine if engine is not None else default_engine
+        self.page_size = page_size
+        self.fetch_workers = fetch_workers
+
+    def dataset_id(self, conn, dataset_name):
+        found = conn.execute(select(models.Dataset.id).where(models.Dataset.name == dataset_name)).first()
+        if found is None:
+            raise ValueError(f"Dataset {dataset_name!r} not found")
+        return found[0]
+
+    def class_names(self, conn, dataset_id):
+        """Class names of the dataset's labels, sorted, so class indices are stable across exports."""
+        query = (
+            select(models.Label.class_name)
+            .join(models.LabelDataset, models.LabelDataset.label_id == models.Label.id)
+            .where(models.LabelDataset.dataset_id == dataset_id)
+            .distinct()
+        )
+        return sorted(conn.execute(query).scalars())
+
+    def iter_pages(self, conn, dataset_id, after_id=None):
+        """Yield lists of (image_id, url, meta_data, [(class_name, bbox), ...]) of at most page_size images."""
+        image = models.Image
+        while True:
+            query = (
+                select(image.id, image.url, image.meta_data)
+                .join(models.ImageDataset, models.ImageDataset.image_id == image.id)
+                .where(models.ImageDataset.dataset_id == dataset_id)
+                .order_by(image.id)
+                .limit(self.page_size)
+            )
+            if after_id is not None:
+                query = query.where(image.id > after_id)
+            rows = conn.execute(query).all()
+            if not rows:
+                return
+            annotations = {row.id: [] for row in rows}
+            query = (
+                select(models.Annotation.image_id, models.Label.class_name, models.Annotation.bbox)
+                .join(models.Label, models.Annotation.label_id == models.Label.id)
+                .where(models.Annotation.image_id.in_(list(annotations)))
+            )
+            result = conn.execute(query.execution_options(stream_results=True, yield_per=1000))
+            for image_id, class_name, bbox in result:
+                if bbox:
+                    annotations[image_id].append((class_name, bbox))
+            yield [(row.id, row.url, row.meta_data, annotations[row.id]) for row in rows]
+            after_id = rows[-1].id
+
+    def fetch_images(self, page):
+        """Download the image files of a page in parallel; returns {url: BytesIO or None}."""
+        by_bucket = {}
+        for _, url, _, _ in page:
+            bucket_name, object_name = split_path_object(url)
+            by_bucket.setdefault(bucket_name, []).append((url, object_name))
+        files = {}
+        for bucket_name, objects in by_bucket.items():
+            data = self.minio_client.get_many(bucket_name, [name for _, name in objects], max_workers=self.fetch_workers)
+            files.update((url, data[name]) for url, name in objects)
+        return files
+
+    def export(self, dataset_name, output_dir, fmt="yolo", with_images=True, after_id=None):
+        """Write the dataset to `output_dir` as "yolo" (images/, labels/, classes.txt) or "coco"
+        (images/, annotations.json). Returns a report with counts and images/sec.
+
+        `after_id` resumes an interrupted YOLO export after the last image id it wrote.
+        """
+        if fmt not in ("yolo", "coco"):
+            raise ValueError("fmt must be 'yolo' or 'coco'")
+        start = time.perf_counter()
+        images_dir = os.path.join(output_dir, "images")
+        os.makedirs(images_dir, exist_ok=True)
+        report = {"images": 0, "annotations": 0, "missing": 0}
+        with self.engine.connect() as conn:
+            dataset_id = self.dataset_id(conn, dataset_name)
+            classes = {name: index for index, name in enumerate(self.class_names(conn, dataset_id))}
+            writer = YoloWriter(output_dir) if fmt == "yolo" else CocoWriter(output_dir)
+            try:
+                for page in self.iter_pages(conn, dataset_id, after_id):
+                    files = self.fetch_images(page) if with_images else {}
+                    for image_id, url, meta_data, annotations in page:
+                        data = files.get(url)
+                        file_name = f"{image_id}{os.path.splitext(url)[1] or '.jpg'}"
+                        if with_images:
+                            if data is None:
+                                report["missing"] += 1
+                                continue
+                            with open(os.path.join(images_dir, file_name), "wb") as f:
+                                f.write(data.getbuffer())
+                        size = parse_size(meta_data)
+                        if size is None and data is not None:
+                            size = Image.open(data).size  # header only, no decode
+                        if size is None:
+                            report["missing"] += 1
+                            continue
+                        for class_name, _ in annotations:
+                            classes.setdefault(class_name, len(classes))
+                        writer.add(image_id, file_name, size, [(classes[name], bbox) for name, bbox in annotations])
+                        report["images"] += 1
+                        report["annotations"] += len(annotations)
+            finally:
+                writer.close(classes)
+        elapsed = time.perf_counter() - start
+        report["seconds"] = round(elapsed, 3)
+        report["images_per_sec"] = round(report["images"] / elapsed, 1) if elapsed else 0.0
+        return report
+
+
+class YoloWriter:
+    """One labels/<image>.txt per image via utils.convertToYolo, plus classes.txt in index order."""
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.labels_dir = os.path.join(output_dir, "labels")
+        os.makedirs(self.labels_dir, exist_ok=True)
+
+    def add(self, image_id, file_name, size, annotations):
+        width, height = size
+        lines = convertToYolo([{index: bbox} for index, bbox in annotations], width, height)
+        with open(os.path.join(self.labels_dir, os.path.splitext(file_name)[0] + ".txt"), "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+
+    def close(self, classes):
+        with open(os.path.join(self.output_dir, "classes.txt"), "w") as f:
+            f.writelines(f"{name}\n" for name in sorted(classes, key=classes.get))
+
+
+class CocoWriter:
+    """annotations.json written incrementally: images and annotations go to two part files that are
+    stitched together with the categories on close, so neither list is held in memory."""
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, "annotations.json")
+        self.images = open(self.path + ".images", "w")
+        self.annotations = open(self.path + ".annotations", "w")
+        self.image_count = 0
+        self.annotation_count = 0
+
+    @staticmethod
+    def _append(f, count, item):
+        f.write(("," if count else "") + json.dumps(item))
+
+    def add(self, image_id, file_name, size, annotations):
+        width, height = size
+        self.image_count += 1
+        self._append(self.images, self.image_count - 1,
+                     {"id": self.image_count, "file_name": file_name, "width": width, "height": height,
+                      "image_uuid": str(image_id)})
+        for index, (x1, y1, x2, y2) in annotations:
+            self.annotation_count += 1
+            self._append(self.annotations, self.annotation_count - 1, {
+                "id": self.annotation_count,
+                "image_id": self.image_count,
+                "category_id": index,
+                "bbox": [x1, y1, x2 - x1, y2 - y1],
+                "area": (x2 - x1) * (y2 - y1),
+                "iscrowd": 0,
+            })
+
+    def close(self, classes):
+        self.images.close()
+        self.annotations.close()
+        categories = [{"id": index, "name": name} for name, index in classes.items()]
+        with open(self.path, "w") as out:
+            out.write('{"images": [')
+            with open(self.images.name) as part:
+                for chunk in iter(lambda: part.read(1 << 20), ""):
+                    out.write(chunk)
+            out.write('], "annotations": [')
+            with open(self.annotations.name) as part:
+                for chunk in iter(lambda: part.read(1 << 20), ""):
+                    out.write(chunk)
+            out.write(f'], "categories": {json.dumps(categories)}}}')
+        os.remove(self.images.name)
+        os.remove(self.annotations.name)
@@ -0,0 +1,142 @@
+import hashlib
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import database.models as models
+
+# Number of set bits of every uint8 value, for Hamming distances between 64-bit hashes.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+class ImageHasher:
+    """Content hash (sha256) and 64-bit perceptual hash (pHash) of an image file."""
+    HASH_SIZE = 8
+    DCT_SIZE = 32
+    _dct = _dct_matrix(DCT_SIZE)
+
+    @staticmethod
+    def sha256(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @classmethod
+    def phash(cls, image: Image) -> int:
+        """pHash: DCT of the 32x32 grayscale image, its 8x8 lowest frequencies compared with their median."""
+        gray = image.convert("L").resize((cls.DCT_SIZE, cls.DCT_SIZE), Image.LANCZOS)
+        pixels = np.asarray(gray, dtype=np.float32)
+        dct = cls._dct @ pixels @ cls._dct.T
+        low = dct[:cls.HASH_SIZE, :cls.HASH_SIZE].flatten()
+        bits = low > np.median(low[1:])
+        return int(np.packbits(bits).view(">u8")[0])
+
+
+def _to_signed(value: int) -> int:
+    # Postgres BigInteger columns are signed 64-bit integers.
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class DedupIndex:
+    """Duplicate index of the ingested images, stored in the `image_hash` table next to `image`.
+
+    Exact duplicates are found by sha256, near-duplicates by the Hamming distance between pHashes
+    (<= `max_distance`). New hashes stay pending until `flush()`, so a failed batch can
+    `discard_pending(mark)` (with the `mark()` taken before it) without recording images that were
+    never ingested. Only call `flush()` once the images' data (Qdrant, DB) is written, otherwise a
+    rerun would skip them as duplicates of themselves.
+
+    A duplicate file is linked to its original once: links already stored, or pending, for the
+    same (original, sha256, path) are not added again, so reruns over a folder add no rows.
+    """
+    def __init__(self, db_session, max_distance: int = 4):
+        self.db = db_session
+        self.max_distance = max_distance
+        image_hash = models.ImageHash
+        rows = db_session.query(
+            image_hash.image_id, image_hash.sha256, image_hash.phash, image_hash.local_path, image_hash.is_duplicate
+        ).all()
+        originals = [(image_id, sha, phash) for image_id, sha, phash, _, is_duplicate in rows if not is_duplicate]
+        self._by_sha = {sha: image_id for image_id, sha, _ in originals}
+        self._ids = [image_id for image_id, _, _ in originals]
+        self._phashes = np.array([phash for _, _, phash in originals], dtype=np.int64).view(np.uint64)
+        self._linked = {(image_id, sha, local_path) for image_id, sha, _, local_path, _ in rows}
+        self._pending = []
+        self._links = []
+
+    def __len__(self):
+        return len(self._ids) + len(self._pending)
+
+    def lookup(self, sha256: str, phash: int) -> Optional[Tuple[str, object, int]]:
+        """("exact" | "near", original image id, distance) if the image is already known, else None."""
+        if sha256 in self._by_sha:
+            return "exact", self._by_sha[sha256], 0
+        candidates = [(self._phashes, self._ids)]
+        if self._pending:
+            candidates.append((
+                np.array([p for _, _, p, _ in self._pending], dtype=np.uint64),
+                [image_id for image_id, _, _, _ in self._pending],
+            ))
+        best = None
+        for phashes, ids in candidates:
+            if len(phashes) == 0:
+                continue
+            xor = np.bitwise_xor(phashes, np.uint64(phash))
+            distances = _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            i = int(np.argmin(distances))
+            if distances[i] <= self.max_distance and (best is None or distances[i] < best[2]):
+                best = ("near", ids[i], int(distances[i]))
+        return best
+
+    def add(self, image_id, sha256: str, phash: int, local_path: str = None):
+        self._by_sha[sha256] = image_id
+        self._pending.append((image_id, sha256, phash, local_path))
+
+    def link(self, image_id, sha256: str, phash: int, local_path: str, distance: int):
+        """Record a duplicate file pointing to its original image `image_id`, unless already recorded."""
+        key = (image_id, sha256, local_path)
+        if key in self._linked:
+            return
+        self._linked.add(key)
+        self._links.append((image_id, sha256, phash, local_path, distance))
+
+    def mark(self) -> Tuple[int, int]:
+        """Current position of the pending hashes, so that `discard_pending` only drops what comes after."""
+        return len(self._pending), len(self._links)
+
+    def discard_pending(self, mark: Tuple[int, int] = (0, 0)):
+        pending, links = mark
+        for _, sha256, _, _ in self._pending[pending:]:
+            self._by_sha.pop(sha256, None)
+        for image_id, sha256, _, local_path, _ in self._links[links:]:
+            self._linked.discard((image_id, sha256, local_path))
+        del self._pending[pending:]
+        del self._links[links:]
+
+    def flush(self):
+        rows = [
+            models.ImageHash(image_id=image_id, sha256=sha256, phash=_to_signed(phash),
+                             local_path=local_path, is_duplicate=False, distance=0)
+            for image_id, sha256, phash, local_path in self._pending
+        ]
+        rows += [
+            models.ImageHash(image_id=image_id, sha256=sha256, phash=_to_signed(phash),
+                             local_path=local_path, is_duplicate=True, distance=distance)
+            for image_id, sha256, phash, local_path, distance in self._links
+        ]
+        if not rows:
+            return
+        self.db.add_all(rows)
+        self.db.commit()
+        self._ids.extend(image_id for image_id, _, _, _ in self._pending)
+        self._linked.update((image_id, sha256, local_path) for image_id, sha256, _, local_path in self._pending)
+        self._phashes = np.concatenate([
+            self._phashes, np.array([phash for _, _, phash, _ in self._pending], dtype=np.uint64)
+        ])
+        self._pending = []
+        self._links = []
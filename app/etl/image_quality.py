@@ -175,3 +175,235 @@ class Blurriness:
         std_scores = 1 - np.exp(-1 * cls.calc_std_grayscale(gray_image) / 100)
         blur_std_score = np.minimum(blur_scores + std_scores, 1)
         return blur_std_score
+
+class ImageMetrics:
+    """Tính toàn bộ các chỉ số chất lượng của một hình ảnh trong một lần duyệt.
+
+    Thay cho việc gọi lần lượt `Brightness`, `Blurriness`, `Entropy` và `AspectRatio` (mỗi lớp tự
+    chuyển đổi hoặc sao chép ảnh), ảnh chỉ được chuyển sang mảng uint8 một lần. Độ sáng theo phân vị
+    được tính từ histogram 256 bin thay vì sắp xếp toàn bộ pixel, entropy và độ sáng trung bình được
+    suy ra từ histogram của PIL, còn độ mờ dùng ảnh thu nhỏ như `Blurriness`.
+
+    Attributes:
+        BINS (int): Số bin của histogram độ sáng.
+    """
+    BINS = 256
+    # Trọng số của bình phương từng kênh màu trong công thức độ sáng, dạng float32.
+    _WEIGHTS = np.array([0.241, 0.691, 0.068], dtype=np.float32)
+
+    @classmethod
+    def brightness_histogram(cls, imarr: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+        """Histogram độ sáng của từng pixel, lượng tử hoá về `BINS` mức trong [0, 1]."""
+        return np.bincount(cls.brightness_index(imarr, color=imarr.ndim == 3).ravel(), minlength=cls.BINS)
+
+    @classmethod
+    def brightness_index(cls, imarr: "np.ndarray[Any, Any]", color: bool) -> "np.ndarray[Any, Any]":
+        """Chỉ số bin độ sáng (uint8) của từng pixel; ảnh xám (`color=False`) dùng trực tiếp mức xám."""
+        if not color:
+            return imarr
+        # Tính trực tiếp bằng float32 (bình phương mức màu là số nguyên nhỏ, chính xác tuyệt đối),
+        # nhanh hơn tra bảng theo chỉ số và cho cùng kết quả.
+        squared = imarr[..., 0].astype(np.float32)
+        squared *= squared
+        squared *= cls._WEIGHTS[0]
+        for channel in (1, 2):
+            band = imarr[..., channel].astype(np.float32)
+            band *= band
+            band *= cls._WEIGHTS[channel]
+            squared += band
+        np.sqrt(squared, out=squared)
+        # sqrt(...) <= 255 nên chỉ số bin = round(độ sáng * (BINS - 1)).
+        squared *= (cls.BINS - 1) / 255.0
+        squared += 0.5
+        return squared.astype(np.uint8)
+
+    @classmethod
+    def percentiles_from_histogram(cls, hist, percentiles) -> "np.ndarray[Any, Any]":
+        """Phân vị (nội suy tuyến tính như `np.percentile`) tính trực tiếp từ histogram.
+
+        Kết quả chính xác với ảnh xám, sai số tối đa 0.5 / (BINS - 1) với ảnh màu.
+        """
+        cdf = np.cumsum(hist)
+        n = cdf[-1]
+        positions = np.asarray(percentiles, dtype=np.float64) / 100 * (n - 1)
+        lower = np.floor(positions)
+        values_lower = np.searchsorted(cdf, lower, side="right")
+        values_upper = np.searchsorted(cdf, np.ceil(positions), side="right")
+        values = values_lower + (values_upper - values_lower) * (positions - lower)
+        return values / (cls.BINS - 1)
+
+    @staticmethod
+    def avg_brightness_from_histogram(pil_hist, num_pixels) -> float:
+        """Độ sáng trung bình từ histogram các kênh của PIL, giống `Brightness.calc_avg_brightness`."""
+        bands = np.asarray(pil_hist, dtype=np.float64).reshape(-1, 256)
+        means = bands @ np.arange(256) / num_pixels
+        if len(means) == 3:
+            red, green, blue = means
+        else:
+            red = green = blue = means[0]  # For B&W images
+        return float(Brightness.calculate_brightness(red, green, blue))
+
+    @staticmethod
+    def entropy_from_histogram(pil_hist) -> float:
+        """Entropy giống `Image.entropy()`, tính trên histogram nối các kênh của PIL."""
+        hist = np.asarray(pil_hist, dtype=np.float64)
+        p = hist[hist > 0] / hist.sum()
+        return float(-(p * np.log2(p)).sum())
+
+    @classmethod
+    def calculate(cls, image: Image) -> Dict[str, float]:
+        """Tính và trả về tất cả các chỉ số chất lượng của hình ảnh.
+
+        Returns:
+            Dict[str, float]: Gồm 'dark_score' (độ sáng phân vị 95), 'light_score' (1 - độ sáng phân
+            vị 5), 'low_information_score', 'blur_score', 'aspect_ratio_score' và 'brightness'.
+        """
+        imarr = np.asarray(image)
+        perc_5, perc_95 = cls.percentiles_from_histogram(cls.brightness_histogram(imarr), [5, 95])
+        pil_hist = image.histogram()
+        num_pixels = image.width * image.height
+        return {
+            "dark_score": float(perc_95),
+            "light_score": float(1 - perc_5),
+            "low_information_score": cls.entropy_from_histogram(pil_hist) / 10,
+            "blur_score": float(Blurriness.calculate_blurriness_score(image)),
+            "aspect_ratio_score": AspectRatio.calc_aspect_ratio_score(image),
+            "brightness": cls.avg_brightness_from_histogram(pil_hist, num_pixels),
+        }
+
+class BatchImageMetrics:
+    """Tính các chỉ số chất lượng cho cả một lô ảnh bằng các phép toán vector hoá của NumPy.
+
+    Nhận một mảng ảnh xếp chồng (N, H, W) / (N, H, W, C) kiểu uint8, hoặc một danh sách ảnh PIL /
+    mảng NumPy (các ảnh cùng kích thước được gom lại và tính chung). Kết quả là một mảng có cấu trúc
+    (structured array) của NumPy với mỗi chỉ số là một cột, cùng thứ tự với ảnh đầu vào. Các giá trị
+    giống `ImageMetrics.calculate`. Với ảnh thumbnail không quá 64 pixel (ví dụ 64x64), độ mờ cũng
+    được tính hoàn toàn vector hoá; ảnh lớn hơn được thu nhỏ bằng PIL như `Blurriness`.
+
+    Attributes:
+        FIELDS (List[str]): Tên các cột của kết quả.
+        MAX_PIXELS_PER_CHUNK (int): Số pixel tối đa được xử lý cùng lúc. Giữ nhỏ để các mảng trung gian
+            của một khối nằm gọn trong cache CPU; khối lớn hơn chậm hơn rõ rệt dù ít vòng lặp hơn.
+    """
+    FIELDS = ["dark_score", "light_score", "low_information_score", "blur_score", "aspect_ratio_score", "brightness"]
+    DTYPE = np.dtype([(name, np.float64) for name in FIELDS])
+    MAX_PIXELS_PER_CHUNK = 1 << 16
+
+    @staticmethod
+    def _histograms(keys: "np.ndarray[Any, Any]", bins: int) -> "np.ndarray[Any, Any]":
+        """Histogram của mọi hàng trong `keys` (N, K, L) kiểu intp chỉ với một lần `np.bincount`.
+
+        Mỗi ảnh có K hàng (ví dụ chỉ số độ sáng và từng kênh màu), kết quả có dạng (N, K, bins).
+        `keys` bị ghi đè; dùng sẵn kiểu intp để `np.bincount` không phải chép lại dữ liệu.
+        """
+        n, k = keys.shape[:2]
+        np.add(keys, np.arange(n * k, dtype=np.intp).reshape(n, k, 1) * bins, out=keys)
+        return np.bincount(keys.ravel(), minlength=n * k * bins).reshape(n, k, bins)
+
+    @staticmethod
+    def _gray(stack: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+        """Chuyển sang ảnh xám với đúng công thức số nguyên của `Image.convert("L")`."""
+        if stack.ndim == 3:
+            return stack.astype(np.int32)
+        gray = stack[..., 0] * np.int32(19595)
+        gray += stack[..., 1] * np.int32(38470)
+        gray += stack[..., 2] * np.int32(7471)
+        gray += 0x8000
+        gray >>= 16
+        return gray
+
+    @classmethod
+    def _blur_scores(cls, gray: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+        """Điểm mờ của một lô ảnh xám nhỏ, giống `Blurriness.calculate_blurriness_score`."""
+        n, h, w = gray.shape
+        # FIND_EDGES của PIL: nhân chập Laplacian 3x3, cắt về [0, 255], giữ nguyên viền ảnh.
+        edges = gray.copy()
+        if h > 2 and w > 2:
+            # 8 * tâm - 8 lân cận = 9 * tâm - tổng khối 3x3 (tính tách theo hàng rồi theo cột).
+            rows = gray[:, :-2, :] + gray[:, 1:-1, :] + gray[:, 2:, :]
+            box = rows[:, :, :-2] + rows[:, :, 1:-1] + rows[:, :, 2:]
+            center = 9 * gray[:, 1:-1, 1:-1] - box
+            edges[:, 1:-1, 1:-1] = np.clip(center, 0, 255)
+        # Phương sai theo đúng công thức của `ImageStat.Stat` (tổng và tổng bình phương là số nguyên
+        # chính xác), nên kết quả trùng từng bit với `Blurriness`.
+        edges = edges.reshape(n, -1)
+        count = edges.shape[1]
+        total = edges.sum(axis=1, dtype=np.int64).astype(np.float64)
+        total2 = np.einsum("ij,ij->i", edges, edges, dtype=np.int64).astype(np.float64)
+        blurriness = np.sqrt((total2 - total ** 2.0 / count) / count)
+        std_grayscale = cls._histograms(gray.reshape(n, 1, -1).astype(np.intp), 256)[:, 0].std(axis=1)
+        blur_scores = 1 - np.exp(-1 * blurriness / 100)
+        std_scores = 1 - np.exp(-1 * std_grayscale / 100)
+        return np.minimum(blur_scores + std_scores, 1)
+
+    @classmethod
+    def _thumbnails(cls, stack: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+        h, w = stack.shape[1:3]
+        ratio = max(w, h) / Blurriness.MAX_RESOLUTION_FOR_BLURRY_DETECTION
+        if ratio <= 1:
+            return stack
+        size = (max(int(w // ratio), 1), max(int(h // ratio), 1))
+        return np.stack([np.asarray(Image.fromarray(img).resize(size)) for img in stack])
+
+    @classmethod
+    def calculate_stack(cls, stack: "np.ndarray[Any, Any]") -> "np.ndarray[Any, Any]":
+        """Tính các chỉ số cho một mảng ảnh cùng kích thước (N, H, W) hoặc (N, H, W, C) kiểu uint8."""
+        stack = np.asarray(stack)
+        if stack.dtype != np.uint8:
+            raise ValueError("stack must be uint8")
+        n, h, w = stack.shape[:3]
+        channels = 1 if stack.ndim == 3 else stack.shape[3]
+        result = np.zeros(n, dtype=cls.DTYPE)
+        chunk = max(1, cls.MAX_PIXELS_PER_CHUNK // (h * w))
+        for start in range(0, n, chunk):
+            part = stack[start:start + chunk]
+            m = part.shape[0]
+            out = result[start:start + m]
+
+            # Một lần đếm cho cả chỉ số độ sáng (hàng 0) và các kênh màu (các hàng sau) của cả khối.
+            keys = np.empty((m, 1 + channels, h * w), dtype=np.intp)
+            keys[:, 0] = ImageMetrics.brightness_index(part, color=stack.ndim == 4).reshape(m, -1)
+            keys[:, 1:] = part.reshape(m, h * w, channels).transpose(0, 2, 1)
+            hist = cls._histograms(keys, 256)
+
+            cdf = np.cumsum(hist[:, 0], axis=1)
+            positions = np.array([5, 95], dtype=np.float64) / 100 * (h * w - 1)
+            lower, upper = np.floor(positions), np.ceil(positions)
+            values_lower = (cdf[:, None, :] <= lower[None, :, None]).sum(axis=2)
+            values_upper = (cdf[:, None, :] <= upper[None, :, None]).sum(axis=2)
+            percentiles = (values_lower + (values_upper - values_lower) * (positions - lower)) / (ImageMetrics.BINS - 1)
+            out["light_score"] = 1 - percentiles[:, 0]
+            out["dark_score"] = percentiles[:, 1]
+
+            # Histogram nối các kênh như `Image.histogram()`, dùng cho entropy và độ sáng trung bình.
+            pil_hist = hist[:, 1:].reshape(m, channels * 256).astype(np.float64)
+            p = pil_hist / pil_hist.sum(axis=1, keepdims=True)
+            log_p = np.log2(p, out=np.zeros_like(p), where=p > 0)
+            out["low_information_score"] = -(p * log_p).sum(axis=1) / 10
+            means = pil_hist.reshape(m, channels, 256) @ np.arange(256) / (h * w)
+            if channels == 3:
+                out["brightness"] = Brightness.calculate_brightness(means[:, 0], means[:, 1], means[:, 2])
+            else:
+                out["brightness"] = Brightness.calculate_brightness(means[:, 0], means[:, 0], means[:, 0])
+
+            out["blur_score"] = cls._blur_scores(cls._gray(cls._thumbnails(part)))
+            out["aspect_ratio_score"] = min(w / h, h / w)
+        return result
+
+    @classmethod
+    def calculate(cls, images) -> "np.ndarray[Any, Any]":
+        """Tính các chỉ số cho một mảng ảnh xếp chồng hoặc một danh sách ảnh PIL / mảng NumPy.
+
+        Returns:
+            np.ndarray: Mảng có cấu trúc độ dài N với các cột trong `FIELDS`, cùng thứ tự đầu vào.
+        """
+        if isinstance(images, np.ndarray):
+            return cls.calculate_stack(images)
+        arrays = [np.asarray(image) for image in images]
+        result = np.zeros(len(arrays), dtype=cls.DTYPE)
+        groups: Dict[Any, list] = {}
+        for i, arr in enumerate(arrays):
+            groups.setdefault(arr.shape, []).append(i)
+        for indices in groups.values():
+            result[indices] = cls.calculate_stack(np.stack([arrays[i] for i in indices]))
+        return result
@@ -1,15 +1,179 @@
 from typing import List, Dict, Any
 
+import cleanlab #type:ignore
+from cleanlab.object_detection import rank #type:ignore
 from cleanlab.object_detection.rank import get_label_quality_scores, issues_from_scores #type:ignore
 from cleanlab.object_detection.filter import find_label_issues #type:ignore
 import numpy as np
+import io
 import os
+import struct
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 import re
 
+from etl.label_score_cache import LabelScoreCache
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff')
+
 def replace_image_extension(image_name):
     return re.sub(r'\.(jpg|jpeg|png|gif|bmp|tiff)$', '.txt', image_name, flags=re.IGNORECASE)
 
+def index_folder(folder_path: str, extensions=None) -> Dict[str, str]:
+    """Map file stem -> file name for one folder, listed once with os.scandir."""
+    index = {}
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if entry.is_file() and (extensions is None or ext.lower() in extensions):
+                index[stem] = entry.name
+    return index
+
+def _jpeg_png_size(image_path: str):
+    """(width, height) straight from the PNG IHDR or the JPEG SOF marker, or None for other files."""
+    with open(image_path, 'rb') as f:
+        head = f.read(24)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:2] != b'\xff\xd8':
+            return None
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            code = marker[1]
+            if code == 0xFF:  # fill byte
+                f.seek(-1, 1)
+                continue
+            if code == 0x01 or 0xD0 <= code <= 0xD8:  # marker without a length
+                continue
+            length = struct.unpack('>H', f.read(2))[0]
+            if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', f.read(5)[1:])
+                return width, height
+            f.seek(length - 2, 1)
+
+@lru_cache(maxsize=None)
+def _image_size(image_path: str, mtime_ns: int):
+    size = _jpeg_png_size(image_path)
+    if size is None:
+        with Image.open(image_path) as img:  # reads the header only, the image is not decoded
+            size = img.size
+    return tuple(size)
+
+def image_size(image_path: str):
+    """(width, height) from the image header, cached per path and modification time."""
+    return _image_size(image_path, os.stat(image_path).st_mtime_ns)
+
+def _clean_yolo_text(text: str, columns: int):
+    """(text, number of rows) of a YOLO txt file, keeping only lines with at least `columns` values
+    (cut to `columns`) when the file is not already a clean table."""
+    if not text:
+        return '', 0
+    if not text.endswith('\n'):
+        text += '\n'
+    rows = text.count('\n')
+    if len(text.split()) == rows * columns:
+        return text, rows
+    lines = [line.split()[:columns] for line in text.splitlines()]
+    lines = [' '.join(line) + '\n' for line in lines if len(line) == columns]
+    return ''.join(lines), len(lines)
+
+def read_yolo_files(file_paths: List[str], columns: int):
+    """Parse many YOLO txt files with a single numpy call.
+
+    Returns the rows of all files stacked as an (n, columns) float64 array and the number of rows
+    of each file. A missing or empty file has 0 rows.
+    """
+    texts, counts = [], []
+    for file_path in file_paths:
+        try:
+            with open(file_path, 'r') as f:
+                text, rows = _clean_yolo_text(f.read(), columns)
+        except FileNotFoundError:
+            text, rows = '', 0
+        texts.append(text)
+        counts.append(rows)
+    counts = np.array(counts, dtype=np.int64)
+    if counts.sum() == 0:
+        return np.empty((0, columns), dtype=np.float64), counts
+    values = np.loadtxt(io.StringIO(''.join(texts)), dtype=np.float64, ndmin=2)
+    return values.reshape(-1, columns), counts
+
+def xywhn_to_xyxy(boxes: np.ndarray, image_width, image_height) -> np.ndarray:
+    """Vectorised convert_bbox_to_absolute for an (n, 4) array of normalised YOLO boxes.
+
+    `image_width` / `image_height` are scalars or one value per box.
+    """
+    half_w, half_h = boxes[:, 2] / 2, boxes[:, 3] / 2
+    return np.stack([
+        (boxes[:, 0] - half_w) * image_width,
+        (boxes[:, 1] - half_h) * image_height,
+        (boxes[:, 0] + half_w) * image_width,
+        (boxes[:, 1] + half_h) * image_height,
+    ], axis=1)
+
+def split_by_file_and_class(counts: np.ndarray, class_ids: np.ndarray, rows: np.ndarray, num_classes: int) -> List[List[np.ndarray]]:
+    """Per file (rows grouped by `counts`), one array per class, with a single stable sort over all
+    rows. Rows of unknown classes are dropped."""
+    file_ids = np.repeat(np.arange(len(counts)), counts)
+    keep = (class_ids >= 0) & (class_ids < num_classes)
+    keys = file_ids[keep] * num_classes + class_ids[keep]
+    order = np.argsort(keys, kind='stable')
+    rows = rows[keep][order]
+    bounds = np.searchsorted(keys[order], np.arange(len(counts) * num_classes + 1)).tolist()
+    return [
+        [rows[bounds[f * num_classes + c]:bounds[f * num_classes + c + 1]] for c in range(num_classes)]
+        for f in range(len(counts))
+    ]
+
+def _image_sizes(image_folder_path: str, images: Dict[str, str], stems: List[str]) -> np.ndarray:
+    return np.array([
+        image_size(os.path.join(image_folder_path, images.get(stem, stem + '.jpg'))) for stem in stems
+    ], dtype=np.float64).reshape(-1, 2)
+
+def image_min_similarities(labels: List[Dict[str, Any]], predictions: List[List[np.ndarray]]) -> np.ndarray:
+    """Smallest non-zero similarity between a label box and a predicted box of every image (1.0 if
+    there is none). ObjectLab scores with the minimum of these over the whole dataset."""
+    return np.array([
+        rank._get_min_possible_similarity(rank.ALPHA, [prediction], [label])
+        for label, prediction in zip(labels, predictions)
+    ], dtype=np.float64)
+
+def objectlab_scores(labels: List[Dict[str, Any]], predictions: List[List[np.ndarray]],
+                     min_possible_similarity: float) -> np.ndarray:
+    """get_label_quality_scores with the dataset-wide `min_possible_similarity` given instead of taken
+    over `labels`, so any subset of the dataset is scored exactly as in a run over all of it.
+
+    Built on cleanlab's private rank helpers, so cleanlab is pinned in trigger-requirements.txt and
+    tests/test_label_quality.py checks the result against get_label_quality_scores.
+    """
+    rank.assert_valid_inputs(labels=labels, predictions=predictions, method="objectlab", threshold=0.0)
+    alpha, low_threshold, high_threshold, temperature = rank._get_valid_subtype_score_params()
+    weights = rank._get_aggregation_weights(None)
+    auxiliary_inputs = [
+        rank._get_valid_inputs_for_compute_scores_per_image(
+            alpha, label=label, prediction=prediction, min_possible_similarity=min_possible_similarity)
+        for label, prediction in zip(labels, predictions)
+    ]
+    overlooked = rank.pool_box_scores_per_image(rank.compute_overlooked_box_scores(
+        alpha=alpha, high_probability_threshold=high_threshold, auxiliary_inputs=auxiliary_inputs),
+        temperature=temperature)
+    badloc = rank.pool_box_scores_per_image(rank.compute_badloc_box_scores(
+        alpha=alpha, low_probability_threshold=low_threshold, auxiliary_inputs=auxiliary_inputs),
+        temperature=temperature)
+    swap = rank.pool_box_scores_per_image(rank.compute_swap_box_scores(
+        alpha=alpha, high_probability_threshold=high_threshold, auxiliary_inputs=auxiliary_inputs,
+        overlapping_label_check=True), temperature=temperature)
+    return np.exp(
+        weights["overlooked"] * np.log(rank.TINY_VALUE + overlooked)
+        + weights["badloc"] * np.log(rank.TINY_VALUE + badloc)
+        + weights["swap"] * np.log(rank.TINY_VALUE + swap)
+    )
+
 class CleanLabObjectDetection:
     def __init__(self):
         pass
@@ -26,8 +190,9 @@ class CleanLabObjectDetection:
 
     @staticmethod
     def length_processing(label_folder_path: str, predict_folder_path: str) -> None:
+        predicted = set(os.listdir(predict_folder_path))
         for item in os.listdir(label_folder_path):
-            if item not in os.listdir(predict_folder_path):
+            if item not in predicted:
                 with open(os.path.join(predict_folder_path, item), 'w') as f:
                     f.write('0 0 0 0 0\n')
 
@@ -80,75 +245,88 @@ class CleanLabObjectDetection:
         if length_label != length_image or length_label != length_predict:
             raise ValueError("The number of labels, images, and predictions are not equal")
 
-    def load_labels(self, label_folder_path: str, image_folder_path: str) -> List[Dict[str, Any]]:
-        labels = []
-        for annotation_file in os.listdir(label_folder_path):
-            image_name = annotation_file.replace('.txt', '.jpg')
-            image_path = os.path.join(image_folder_path, image_name)
+    def load_labels(self, label_folder_path: str, image_folder_path: str, stems: List[str] = None,
+                    images: Dict[str, str] = None, empty_placeholder: bool = False) -> List[Dict[str, Any]]:
+        """Ground-truth boxes of the images `stems` (default: every label file, sorted by name).
 
-            with Image.open(image_path) as img:
-                image_width, image_height = img.size
-
-            with open(os.path.join(label_folder_path, annotation_file), 'r') as file:
-                bboxes = []
-                classes = []
-                for line in file:
-                    class_id, x_center, y_center, width, height = map(float, line.split())
-                    bbox_absolute = self.convert_bbox_to_absolute([x_center, y_center, width, height], image_width, image_height)
-                    bboxes.append(bbox_absolute)
-                    classes.append(int(class_id))
-
-                labels.append({
-                    'bboxes': np.array(bboxes, dtype=np.float32),
-                    'labels': np.array(classes),
-                    'seg_map': image_name
-                })
-        return labels
-
-    def load_predictions(self, image_folder_path: str, predict_folder_path: str, num_classes: int) -> List[List[np.ndarray]]:
-        predictions = []
-        for predict_file in os.listdir(predict_folder_path):
-            image_name = predict_file.replace('.txt', '.jpg')
-            image_path = os.path.join(image_folder_path, image_name)
+        All label files are parsed together, and image sizes come from the image headers, read
+        once and cached. `images` (stem -> image file name) saves listing the image folder again.
+        With `empty_placeholder`, a missing or empty label file counts as the single "0 0 0 0 0"
+        box that processing_empty_label would have written, without touching the file.
+        """
+        if images is None:
+            images = index_folder(image_folder_path, IMAGE_EXTENSIONS)
+        if stems is None:
+            stems = sorted(index_folder(label_folder_path, ('.txt',)))
+        rows, counts = read_yolo_files([os.path.join(label_folder_path, stem + '.txt') for stem in stems], 5)
+        if empty_placeholder and (counts == 0).any():
+            empty = counts == 0
+            rows = np.insert(rows, (np.cumsum(counts) - counts)[empty], 0, axis=0)
+            counts[empty] = 1
+        sizes = np.repeat(_image_sizes(image_folder_path, images, stems), counts, axis=0)
+        bboxes = xywhn_to_xyxy(rows[:, 1:5], sizes[:, 0], sizes[:, 1]).astype(np.float32)
+        classes = rows[:, 0].astype(np.int64)
+        bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+        return [
+            {
+                'bboxes': bboxes[bounds[i]:bounds[i + 1]],
+                'labels': classes[bounds[i]:bounds[i + 1]],
+                'seg_map': images.get(stem, stem + '.jpg')
+            }
+            for i, stem in enumerate(stems)
+        ]
+
+    def load_predictions(self, image_folder_path: str, predict_folder_path: str, num_classes: int,
+                         stems: List[str] = None, images: Dict[str, str] = None) -> List[List[np.ndarray]]:
+        """Predicted boxes of the images `stems` (default: every prediction file with an image, sorted
+        by name), as one (n, 5) array of [x_min, y_min, x_max, y_max, confidence] per class.
+
+        Pass the same `stems` as load_labels so both lists line up image by image. A missing or
+        empty prediction file gives no boxes.
+        """
+        if images is None:
+            images = index_folder(image_folder_path, IMAGE_EXTENSIONS)
+        if stems is None:
+            stems = sorted(stem for stem in index_folder(predict_folder_path, ('.txt',)) if stem in images)
+        rows, counts = read_yolo_files([os.path.join(predict_folder_path, stem + '.txt') for stem in stems], 6)
+        sizes = np.repeat(_image_sizes(image_folder_path, images, stems), counts, axis=0)
+        boxes = np.concatenate([xywhn_to_xyxy(rows[:, 1:5], sizes[:, 0], sizes[:, 1]), rows[:, 5:6]], axis=1)
+        return split_by_file_and_class(counts, rows[:, 0].astype(np.int64), boxes, num_classes)
+
+    def clean_lap(self, label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                  threshold: float = 0.8, shard_size: int = None, max_workers: int = None, cache_path: str = None) -> List[str]:
+        """Find images whose labels disagree with the predictions; returns (image, label, prediction) paths.
 
-            if os.path.isfile(image_path):
-                with Image.open(image_path) as img:
-                    image_width, image_height = img.size
-
-                file_path = os.path.join(predict_folder_path, predict_file)
-                if os.path.isfile(file_path):
-                    bboxes_by_class = [np.array([], dtype=np.float32).reshape(0, 5) for _ in range(num_classes)]
-                    with open(file_path, 'r') as file:
-                        for line in file:
-                            parts = line.strip().split()
-                            if len(parts) >= 6:
-                                class_id, x_center, y_center, width, height, confidence = map(float, parts)
-                                class_id = int(class_id)
-                                bbox_absolute = self.convert_bbox_to_absolute([x_center, y_center, width, height], image_width, image_height)
-                                bbox_with_confidence = bbox_absolute + [confidence]
-                                if 0 <= class_id < num_classes:
-                                    bboxes_by_class[class_id] = np.append(bboxes_by_class[class_id], [bbox_with_confidence], axis=0)
-                    predictions.append(bboxes_by_class)
-        return predictions
-
-    def clean_lap(self, label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int, threshold: float = 0.8) -> List[str]:
-        self.processing_empty_label(label_folder_path)
-        self.processing_empty_label(predict_folder_path)
-        self.length_processing(label_folder_path, predict_folder_path)
-        self.validate_lengths(label_folder_path, image_folder_path, predict_folder_path)
-        labels = self.load_labels(label_folder_path, image_folder_path)
-        predictions = self.load_predictions(image_folder_path, predict_folder_path, num_classes)
-
-        scores = get_label_quality_scores(labels, predictions)
+        Missing or empty label and prediction files are handled in memory, and the folders are never
+        modified. With `shard_size`, the images are scored in shards of that many images on a
+        process pool of `max_workers` (default: all cores), so memory stays bounded by the shard size.
+        ObjectLab scores depend on the smallest box similarity of the whole dataset, so a first pass
+        over the shards finds it and every shard is then scored with it: the merged result is the
+        same as an unsharded run.
+        With `cache_path`, scores are kept in a LabelScoreCache there. Only images whose label or
+        prediction file or size changed since the last run are scored again, unless the change moves
+        the dataset's smallest similarity, in which case every image is.
+        """
+        images = index_folder(image_folder_path, IMAGE_EXTENSIONS)
+        stems = sorted(index_folder(label_folder_path, ('.txt',)))
+        missing = [stem for stem in stems if stem not in images]
+        if missing:
+            raise ValueError(f"{len(missing)} labels have no image, e.g. {missing[0]}")
+
+        if cache_path is None:
+            scores = self.score_images(label_folder_path, predict_folder_path, image_folder_path, num_classes,
+                                       stems, images, shard_size, max_workers)
+        else:
+            scores = self._cached_scores(cache_path, label_folder_path, predict_folder_path, image_folder_path,
+                                         num_classes, stems, images, shard_size, max_workers)
         issue_idx = issues_from_scores(scores, threshold=threshold)
 
         img_paths = []
         predict_paths = []
         label_paths = []
         for item in issue_idx:
-            label = labels[item]
-            image_name =  label['seg_map']
-            txt_name =  replace_image_extension(image_name)
+            image_name = images[stems[item]]
+            txt_name = stems[item] + '.txt'
             label_path = os.path.join(label_folder_path, txt_name)
             predict_path = os.path.join(predict_folder_path, txt_name)
             image_path = os.path.join(image_folder_path, image_name)
@@ -156,5 +334,95 @@ class CleanLabObjectDetection:
             predict_paths.append(predict_path)
             label_paths.append(label_path)
         return img_paths, label_paths, predict_paths
-        
-            
+
+    def _cached_scores(self, cache_path: str, label_folder_path: str, predict_folder_path: str, image_folder_path: str,
+                       num_classes: int, stems: List[str], images: Dict[str, str], shard_size: int = None,
+                       max_workers: int = None) -> np.ndarray:
+        cache = LabelScoreCache(cache_path, scorer_version=cleanlab.__version__)
+        try:
+            keys = cache.keys(label_folder_path, predict_folder_path, stems,
+                              _image_sizes(image_folder_path, images, stems))
+            cached = cache.lookup(keys, num_classes)
+            changed = [stem for stem in stems if stem not in cached]
+            min_similarities = {stem: entry[0] for stem, entry in cached.items()}
+            min_similarities.update(zip(changed, self.min_similarities(
+                label_folder_path, predict_folder_path, image_folder_path, num_classes, changed, images,
+                shard_size, max_workers)))
+            dataset_min = float(np.min(list(min_similarities.values()), initial=1.0))
+            # A score is only valid for the dataset minimum it was computed with.
+            to_score = [stem for stem in stems if stem not in cached or cached[stem][1] != dataset_min]
+            print(f"Label quality cache: {len(stems) - len(to_score)} cached, {len(to_score)} to score "
+                  f"({len(changed)} changed files)")
+            new_scores = self.score_images(label_folder_path, predict_folder_path, image_folder_path, num_classes,
+                                           to_score, images, shard_size, max_workers, min_similarity=dataset_min)
+            cache.store(keys, num_classes, to_score, [min_similarities[stem] for stem in to_score],
+                        dataset_min, new_scores)
+        finally:
+            cache.close()
+        scores = {stem: entry[2] for stem, entry in cached.items()}
+        scores.update(zip(to_score, new_scores))
+        return np.array([scores[stem] for stem in stems], dtype=np.float64)
+
+    def score_images(self, label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                     stems: List[str], images: Dict[str, str], shard_size: int = None, max_workers: int = None,
+                     min_similarity: float = None) -> np.ndarray:
+        """Label quality score of every image in `stems`, in order; see clean_lap for sharding.
+
+        `min_similarity` is the dataset's smallest box similarity (see image_min_similarities); it
+        is computed over `stems` when not given.
+        """
+        if min_similarity is None and shard_size is None:
+            return _score_shard(label_folder_path, predict_folder_path, image_folder_path, num_classes, stems, images)
+        if min_similarity is None:
+            min_similarity = float(np.min(self.min_similarities(
+                label_folder_path, predict_folder_path, image_folder_path, num_classes, stems, images,
+                shard_size, max_workers), initial=1.0))
+        return _map_shards(_score_shard, label_folder_path, predict_folder_path, image_folder_path, num_classes,
+                           stems, images, shard_size, max_workers, min_similarity)
+
+    def min_similarities(self, label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                         stems: List[str], images: Dict[str, str], shard_size: int = None, max_workers: int = None) -> np.ndarray:
+        """image_min_similarities of every image in `stems`, in order, sharded like score_images."""
+        return _map_shards(_min_similarity_shard, label_folder_path, predict_folder_path, image_folder_path, num_classes,
+                           stems, images, shard_size, max_workers)
+
+def _map_shards(fn, label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                stems: List[str], images: Dict[str, str], shard_size: int = None, max_workers: int = None, *args) -> np.ndarray:
+    """Run `fn` over `stems` in one go, or in shards of `shard_size` on a process pool, and concatenate."""
+    if shard_size is None:
+        return fn(label_folder_path, predict_folder_path, image_folder_path, num_classes, stems, images, *args)
+    shards = [stems[i:i + shard_size] for i in range(0, len(stems), shard_size)]
+    if not shards:
+        return np.empty(0)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(fn, label_folder_path, predict_folder_path, image_folder_path, num_classes,
+                            shard, {stem: images[stem] for stem in shard}, *args)
+            for shard in shards
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+def _load_shard(label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                stems: List[str], images: Dict[str, str]):
+    detector = CleanLabObjectDetection()
+    labels = detector.load_labels(label_folder_path, image_folder_path, stems, images, empty_placeholder=True)
+    predictions = detector.load_predictions(image_folder_path, predict_folder_path, num_classes, stems, images)
+    return labels, predictions
+
+def _min_similarity_shard(label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                          stems: List[str], images: Dict[str, str]) -> np.ndarray:
+    labels, predictions = _load_shard(label_folder_path, predict_folder_path, image_folder_path, num_classes, stems, images)
+    return image_min_similarities(labels, predictions)
+
+def _score_shard(label_folder_path: str, predict_folder_path: str, image_folder_path: str, num_classes: int,
+                 stems: List[str], images: Dict[str, str], min_similarity: float = None) -> np.ndarray:
+    """Label quality score of every image in `stems`; runs in a pool process in sharded mode.
+
+    Without `min_similarity` the shard is scored as a whole dataset by cleanlab itself.
+    """
+    labels, predictions = _load_shard(label_folder_path, predict_folder_path, image_folder_path, num_classes, stems, images)
+    if not labels:
+        return np.empty(0)
+    if min_similarity is None:
+        return get_label_quality_scores(labels, predictions, verbose=False)
+    return objectlab_scores(labels, predictions, min_similarity)
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import hashlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+COLUMNS = ('stem', 'label_hash', 'predict_hash', 'image_size', 'num_classes', 'scorer_version',
+           'min_similarity', 'dataset_min_similarity', 'score')
+
+
+def content_hash(file_path: str) -> str:
+    """sha256 of a label or prediction file; a missing file hashes to "" (same as an empty one)."""
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return ''
+    return hashlib.sha256(data).hexdigest() if data else ''
+
+
+class LabelScoreCache:
+    """Label quality scores of clean_lap, kept in a local SQLite file between runs.
+
+    An image's entry is keyed by its stem, the content hashes of its label and prediction files,
+    its size, the number of classes and a scorer version (the cleanlab version). It holds the
+    image's own smallest box similarity, which depends only on that key, and its score, which also
+    depends on the smallest similarity of the whole dataset (`dataset_min_similarity`). A score is
+    reused only while both the key and the dataset minimum are unchanged, so it always equals the
+    score of a full run.
+    """
+    def __init__(self, db_path: str, scorer_version: str = ''):
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.db_path = db_path
+        self.scorer_version = scorer_version
+        self.conn = sqlite3.connect(db_path)
+        existing = tuple(row[1] for row in self.conn.execute('PRAGMA table_info(label_score)'))
+        if existing and existing != COLUMNS:
+            # Written by an older version of this cache: its scores cannot be trusted.
+            self.conn.execute('DROP TABLE label_score')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS label_score ('
+            ' stem TEXT PRIMARY KEY, label_hash TEXT NOT NULL, predict_hash TEXT NOT NULL, image_size TEXT NOT NULL,'
+            ' num_classes INTEGER NOT NULL, scorer_version TEXT NOT NULL, min_similarity REAL NOT NULL,'
+            ' dataset_min_similarity REAL NOT NULL, score REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def keys(self, label_folder_path: str, predict_folder_path: str, stems: List[str],
+             sizes: np.ndarray) -> Dict[str, Tuple[str, str, str]]:
+        """Key of every stem; `sizes` holds the (width, height) of each image, in the order of `stems`."""
+        return {
+            stem: (content_hash(os.path.join(label_folder_path, stem + '.txt')),
+                   content_hash(os.path.join(predict_folder_path, stem + '.txt')),
+                   f'{int(width)}x{int(height)}')
+            for stem, (width, height) in zip(stems, sizes)
+        }
+
+    def lookup(self, keys: Dict[str, Tuple[str, str, str]], num_classes: int) -> Dict[str, Tuple[float, float, float]]:
+        """(min_similarity, dataset_min_similarity, score) of the stems whose key still matches."""
+        found = {}
+        rows = self.conn.execute(
+            'SELECT stem, label_hash, predict_hash, image_size, min_similarity, dataset_min_similarity, score'
+            ' FROM label_score WHERE num_classes = ? AND scorer_version = ?',
+            (num_classes, self.scorer_version)
+        )
+        for stem, label_hash, predict_hash, image_size, min_similarity, dataset_min_similarity, score in rows:
+            if keys.get(stem) == (label_hash, predict_hash, image_size):
+                found[stem] = (min_similarity, dataset_min_similarity, score)
+        return found
+
+    def store(self, keys: Dict[str, Tuple[str, str, str]], num_classes: int, stems: List[str],
+              min_similarities: np.ndarray, dataset_min_similarity: float, scores: np.ndarray) -> None:
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO label_score VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                ((stem, *keys[stem], num_classes, self.scorer_version, float(min_similarity),
+                  float(dataset_min_similarity), float(score))
+                 for stem, min_similarity, score in zip(stems, min_similarities, scores))
+            )
+
+    def close(self) -> None:
+        self.conn.close()
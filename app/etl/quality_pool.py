@@ -0,0 +1,97 @@
+import atexit
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any
+
+import numpy as np
+from PIL import Image
+
+from etl.image_quality import ImageMetrics
+
+
+def _calculate_from_shared_memory(name: str, shape, dtype: str) -> Dict[str, float]:
+    """Runs in a pool process: reads the frame from shared memory (the image is not pickled) and computes its metrics."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        frame = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        metrics = ImageMetrics.calculate(Image.fromarray(frame))
+        del frame
+        return metrics
+    finally:
+        shm.close()
+
+
+class QualityMetricsPool:
+    """Computes image quality metrics in a dedicated process pool, off the thread running the models.
+
+    Each decoded frame is copied once into `multiprocessing.shared_memory` instead of being pickled;
+    pool processes only receive the block's name. Results are collected by image id. With
+    `max_workers=0`, metrics are computed in the current process.
+    """
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor = None
+        if max_workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"))
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, id_image, image: Image) -> None:
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        if self._executor is None:
+            self._pending[id_image] = (None, ImageMetrics.calculate(image))
+            return
+        frame = np.asarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(frame.nbytes, 1))
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf)[...] = frame
+        future = self._executor.submit(_calculate_from_shared_memory, shm.name, frame.shape, frame.dtype.str)
+        with self._lock:
+            self._pending[id_image] = (shm, future)
+
+    def result(self, id_image) -> Dict[str, Any]:
+        """Wait for and return the metrics of `id_image`, releasing its shared memory block."""
+        with self._lock:
+            shm, future = self._pending.pop(id_image)
+        if shm is None:
+            return future  # computed in process: `future` already is the result
+        try:
+            return future.result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def results(self, ids) -> Dict[Any, Dict[str, Any]]:
+        return {id_image: self.result(id_image) for id_image in ids}
+
+    def discard(self, ids=None) -> None:
+        """Drop the pending results of `ids` (default: all), e.g. after a failed batch, and release their shared memory."""
+        with self._lock:
+            ids = [id_image for id_image in (list(self._pending) if ids is None else ids) if id_image in self._pending]
+        for id_image in ids:
+            try:
+                self.result(id_image)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        self.discard()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_quality_pool(max_workers: int = 2) -> QualityMetricsPool:
+    """The pool shared by the current process, closed when the process exits."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = QualityMetricsPool(max_workers)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -1,25 +1,152 @@
 import cv2
 import numpy as np
 
+import asyncio
 import base64
 import json
+import time
+import threading
+import httpx
 import requests
 import requests.utils
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from enum import Enum
-from typing import Any, Dict
+from urllib.parse import quote
+from typing import Any, Dict, Iterable, Iterator, Tuple, Union
 
 from configure import Config
 
 _USER_AGENT = f"{requests.utils.default_user_agent()}"
 config = Config()
-
-
-def make_requests_session() -> requests.Session:
+# Gateway errors worth retrying: Nuclio returns them while a function is scaling or restarting.
+RETRY_STATUSES = (429, 502, 503, 504)
+TRANSPORTS = ("json", "binary", "msgpack")
+
+
+def make_requests_session(pool_maxsize: int = None, max_retries: int = None, backoff: float = None) -> requests.Session:
+    """Long-lived session with a connection pool of `pool_maxsize` keep-alive connections and
+    retries with exponential backoff on connection errors and RETRY_STATUSES."""
+    pool_maxsize = Config.nuclio.NUCLIO_POOL_MAXSIZE if pool_maxsize is None else pool_maxsize
+    retry = Retry(
+        total=Config.nuclio.NUCLIO_MAX_RETRIES if max_retries is None else max_retries,
+        backoff_factor=Config.nuclio.NUCLIO_RETRY_BACKOFF if backoff is None else backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # invocations are idempotent inference calls, POST included
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
     session = requests.Session()
     session.headers['User-Agent'] = _USER_AGENT
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
     return session
 
 
+def latency_percentiles(latencies) -> Dict[str, float]:
+    """p50 / p90 / p99 / max of request latencies given in seconds, in milliseconds."""
+    if not len(latencies):
+        return {}
+    values = np.asarray(latencies) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"requests": len(values), "p50_ms": round(p50, 1), "p90_ms": round(p90, 1),
+            "p99_ms": round(p99, 1), "max_ms": round(values.max(), 1)}
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class ImageProfile:
+    """How the images sent to one function are prepared on the client.
+
+    Frames are downscaled (never upscaled) with INTER_AREA so that the long side is at most
+    `max_side` and the short side at most `min_side`, then encoded as `encode_format` (".jpg",
+    ".webp" or ".png") at `quality` (JPEG/WebP 0-100, PNG compression level 0-9; None keeps the
+    OpenCV default). Coordinates under `coordinate_keys` of the response are mapped back to the
+    original frame. Their lists of numbers hold points of `point_dims` values each, x and y first,
+    e.g. [x1, y1, x2, y2] boxes with 2 or (x, y, conf) keypoints with 3; they may be nested to any
+    depth, and a list whose length is not a multiple of `point_dims` is an error.
+    """
+    CONTENT_TYPES = {".jpg": "image/jpeg", ".webp": "image/webp", ".png": "image/png"}
+    QUALITY_FLAGS = {".jpg": cv2.IMWRITE_JPEG_QUALITY, ".webp": cv2.IMWRITE_WEBP_QUALITY,
+                     ".png": cv2.IMWRITE_PNG_COMPRESSION}
+
+    def __init__(self, max_side: int = None, min_side: int = None, encode_format: str = ".jpg",
+                 quality: int = None, coordinate_keys: Tuple[str, ...] = (), point_dims: int = 2):
+        if encode_format not in self.CONTENT_TYPES:
+            raise ValueError(f"encode_format must be one of {tuple(self.CONTENT_TYPES)}")
+        if point_dims < 2:
+            raise ValueError("point_dims must be at least 2 (x, y)")
+        self.max_side = max_side
+        self.min_side = min_side
+        self.encode_format = encode_format
+        self.quality = quality
+        self.coordinate_keys = tuple(coordinate_keys)
+        self.point_dims = point_dims
+
+    @property
+    def content_type(self) -> str:
+        return self.CONTENT_TYPES[self.encode_format]
+
+    def resize(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[float, float]]:
+        """The downscaled image and the (x, y) factors from its coordinates to the original ones."""
+        height, width = image.shape[:2]
+        factor = 1.0
+        if self.max_side:
+            factor = min(factor, self.max_side / max(height, width))
+        if self.min_side:
+            factor = min(factor, self.min_side / min(height, width))
+        if factor >= 1.0:
+            return image, (1.0, 1.0)
+        size = (max(1, round(width * factor)), max(1, round(height * factor)))
+        resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return resized, (width / size[0], height / size[1])
+
+    def prepare(self, image: np.ndarray) -> Tuple[bytes, Tuple[float, float]]:
+        if not isinstance(image, np.ndarray):
+            raise ValueError("image must be a numpy array")
+        image, scale = self.resize(image)
+        params = [self.QUALITY_FLAGS[self.encode_format], int(self.quality)] if self.quality is not None else []
+        ok, im_arr = cv2.imencode(self.encode_format, image, params)
+        if not ok:
+            raise ValueError(f"could not encode image as {self.encode_format}")
+        return im_arr.tobytes(), scale
+
+    def restore(self, response: Any, scale: Tuple[float, float]) -> Any:
+        if scale == (1.0, 1.0) or not self.coordinate_keys:
+            return response
+        if isinstance(response, list):
+            return [self.restore(item, scale) for item in response]
+        if isinstance(response, dict):
+            return {key: _scale_points(value, *scale, self.point_dims) if key in self.coordinate_keys else value
+                    for key, value in response.items()}
+        return response
+
+
+def _scale_points(value, sx, sy, point_dims):
+    if not isinstance(value, list):
+        return value
+    if value and all(isinstance(v, (int, float)) for v in value):
+        if len(value) % point_dims:
+            raise ValueError(f"expected points of {point_dims} values, got a list of {len(value)}")
+        factors = (sx, sy) + (1,) * (point_dims - 2)
+        return [v * factors[i % point_dims] for i, v in enumerate(value)]
+    return [_scale_points(v, sx, sy, point_dims) for v in value]
+
+
+# Profiles of the functions in serverless/task, by function name. CLIP resizes the short side to
+# 224 and center-crops; the YOLO pose model letterboxes to 640. Other functions get the full frame.
+PROFILES = {
+    "extract-image-features": ImageProfile(min_side=224, quality=90),
+    "extract-text-features": ImageProfile(min_side=224, quality=90),
+    "detect-ads": ImageProfile(max_side=640, quality=90, coordinate_keys=("keypoints",), point_dims=3),
+}
+
+
 class LambdaType(Enum):
     DETECTOR = "detector"
     KEYPOINTOR = "keypointor"
@@ -32,51 +159,86 @@ class LambdaType(Enum):
         return self.value
 
 
-class LambdaGateway:
+class _NuclioGateway:
+    """Dashboard URL, timeout and headers shared by the sync and async gateways."""
     NUCLIO_ROOT_URL = '/api/functions'
+    INVOCATIONS_URL = '/api/function_invocations'
+
+    def _configure(self, gateway_url):
+        nuclio = Config.nuclio
+        self.gateway_url = gateway_url or '{}://{}:{}'.format(
+            nuclio.NUCLIO_SCHEME,
+            nuclio.NUCLIO_HOST,
+            nuclio.NUCLIO_PORT)
+        self.timeout = int(nuclio.NUCLIO_DEFAULT_TIMEOUT)
+        self.headers = {
+            'x-nuclio-project-name': 'default',
+            'x-nuclio-function-namespace': nuclio.NUCLIO_FUNCTION_NAMESPACE,
+            'x-nuclio-invoke-via': 'domain-name',
+            'X-Nuclio-Invoke-Timeout': f"{self.timeout}s",
+        }
+
+    @staticmethod
+    def _invocation_headers(func, headers=None):
+        return {
+            **(headers or {}),
+            'x-nuclio-function-name': func.id,
+            'x-nuclio-path': '/'
+        }
+
+
+class LambdaGateway(_NuclioGateway):
+    """Nuclio dashboard client sharing one pooled keep-alive session across all calls.
+
+    The gateway URL, timeout and common headers are computed once. The gateway is thread-safe, so
+    a single instance can serve concurrent invocations. Calls made with `retries=False` go through a
+    second session without retries, for callers that retry (and time) each attempt themselves.
+    """
+    def __init__(self, gateway_url: str = None, pool_maxsize: int = None, max_retries: int = None):
+        self._configure(gateway_url)
+        self.pool_maxsize = pool_maxsize
+        self.session = make_requests_session(pool_maxsize=pool_maxsize, max_retries=max_retries)
+        self._single_attempt_session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def single_attempt_session(self) -> requests.Session:
+        with self._session_lock:
+            if self._single_attempt_session is None:
+                self._single_attempt_session = make_requests_session(pool_maxsize=self.pool_maxsize, max_retries=0)
+            return self._single_attempt_session
 
     def _http(
         self,
         method="get", scheme=None,
         host=None, port=None, function_namespace=None,
-        url=None, headers=None, data=None
+        url=None, headers=None, data=None, body=None, retries=True
     ):
-        NUCLIO_GATEWAY = '{}://{}:{}'.format(
-            config.NUCLIO_SCHEME,
-            config.NUCLIO_HOST,
-            config.NUCLIO_PORT)
-        NUCLIO_FUNCTION_NAMESPACE = config.NUCLIO_FUNCTION_NAMESPACE
-        NUCLIO_TIMEOUT = config.NUCLIO_DEFAULT_TIMEOUT
-        extra_headers = {
-            'x-nuclio-project-name': 'default',
-            'x-nuclio-function-namespace': NUCLIO_FUNCTION_NAMESPACE,
-            'x-nuclio-invoke-via': 'domain-name',
-            'X-Nuclio-Invoke-Timeout': f"{int(NUCLIO_TIMEOUT)}s",
-        }
-        if headers:
-            extra_headers.update(headers)
-
-        if url:
-            url = "{}{}".format(NUCLIO_GATEWAY, url)
-        else:
-            url = NUCLIO_GATEWAY
-
-        with make_requests_session() as session:
-            reply = session.request(
-                method,
-                url,
-                headers=extra_headers,
-                timeout=int(NUCLIO_TIMEOUT),
-                json=data
-            )
-            reply.raise_for_status()
-            try:
-                response = reply.json()
-            except Exception:
-                response = reply.text
+        extra_headers = {**self.headers, **headers} if headers else self.headers
+        url = "{}{}".format(self.gateway_url, url) if url else self.gateway_url
+        session = self.session if retries else self.single_attempt_session
+
+        reply = session.request(
+            method,
+            url,
+            headers=extra_headers,
+            timeout=self.timeout,
+            json=data if body is None else None,
+            data=body
+        )
+        reply.raise_for_status()
+        try:
+            response = reply.json()
+        except Exception:
+            response = reply.text
 
         return response
 
+    def close(self):
+        self.session.close()
+        if self._single_attempt_session is not None:
+            self._single_attempt_session.close()
+
     def get_all(self):
         response = self._http(url=self.NUCLIO_ROOT_URL)
         return response
@@ -85,24 +247,203 @@ class LambdaGateway:
         response = self._http(url=self.NUCLIO_ROOT_URL + '/' + func_id)
         return response
 
-    def invoke(self, func, payload):
-        return self._invoke_via_dashboard(func, payload)
+    def invoke(self, func, payload, body=None, headers=None, retries=True):
+        """Invoke `func` with a JSON `payload`, or with a raw `body` whose Content-Type and
+        parameters are given in `headers`. `retries=False` makes a single attempt."""
+        return self._invoke_via_dashboard(func, payload, body=body, headers=headers, retries=retries)
 
-    def _invoke_via_dashboard(self, func, payload):
+    def _invoke_via_dashboard(self, func, payload, body=None, headers=None, retries=True):
         return self._http(
             method="post",
-            url='/api/function_invocations',
-            data=payload, headers={
-                'x-nuclio-function-name': func.id,
-                'x-nuclio-path': '/'
-            })
+            url=self.INVOCATIONS_URL,
+            data=payload, body=body, retries=retries,
+            headers=self._invocation_headers(func, headers))
+
+
+class AsyncLambdaGateway(_NuclioGateway):
+    """asyncio counterpart of LambdaGateway on an httpx.AsyncClient, for hundreds of invocations in flight.
+
+    Connections are capped at `max_connections`; calls beyond that wait for a free connection.
+    Failed calls are retried like the sync gateway. Every call is a coroutine; use it as
+    `async with AsyncLambdaGateway() as gw`.
+    """
+    def __init__(self, gateway_url: str = None, max_connections: int = None, max_retries: int = None):
+        self._configure(gateway_url)
+        nuclio = Config.nuclio
+        max_connections = nuclio.NUCLIO_POOL_MAXSIZE if max_connections is None else max_connections
+        self.max_retries = nuclio.NUCLIO_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = nuclio.NUCLIO_RETRY_BACKOFF
+        self.client = httpx.AsyncClient(
+            base_url=self.gateway_url,
+            headers={**self.headers, 'User-Agent': _USER_AGENT},
+            timeout=httpx.Timeout(self.timeout, pool=None),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def get_all(self):
+        return await self._http(url=self.NUCLIO_ROOT_URL)
+
+    async def get(self, func_id):
+        return await self._http(url=self.NUCLIO_ROOT_URL + '/' + func_id)
+
+    async def invoke(self, func, payload, body=None, headers=None, retries=True):
+        """Invoke `func` like LambdaGateway.invoke."""
+        return await self._http(method="post", url=self.INVOCATIONS_URL, data=payload, body=body,
+                                retries=retries, headers=self._invocation_headers(func, headers))
+
+    async def _http(self, method="get", url=None, headers=None, data=None, body=None, retries=True):
+        max_retries = self.max_retries if retries else 0
+        for attempt in range(max_retries + 1):
+            try:
+                reply = await self.client.request(method, url or '', headers=headers,
+                                                  json=data if body is None else None, content=body)
+                if reply.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    break
+            except httpx.TransportError:
+                if attempt == max_retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+        reply.raise_for_status()
+        try:
+            return reply.json()
+        except Exception:
+            return reply.text
+
+
+def load_function(gateway: LambdaGateway, function_name: str):
+    try:
+        function = gateway.get(func_id=function_name)
+        return function
+    except Exception as e:
+        raise Exception("Can not connect to function", e)
+
+
+class FunctionRegistry:
+    """Parsed function specs of one Nuclio dashboard, shared by every LambdaFunction of the process.
+
+    A spec is fetched and parsed on first use. Once older than `ttl` seconds it is still served
+    while a background thread fetches it again (stale-while-revalidate), so only the very first
+    handle of a function waits for the dashboard. If a refresh fails, the old spec is kept and
+    retried after the next `ttl`. `preload()` fills the registry with one get_all call.
+    """
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, gateway: Union[LambdaGateway, AsyncLambdaGateway], ttl: float = None):
+        if not isinstance(gateway, LambdaGateway):
+            # Specs are fetched synchronously, from handle constructors and refresh threads.
+            gateway = LambdaGateway(gateway_url=gateway.gateway_url)
+        self.gateway = gateway
+        self.ttl = Config.nuclio.NUCLIO_SPEC_TTL if ttl is None else ttl
+        self._specs = {}  # function name -> (parsed fields, loaded at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    @classmethod
+    def for_gateway(cls, gateway: Union[LambdaGateway, AsyncLambdaGateway]) -> "FunctionRegistry":
+        """The process-wide registry of the dashboard `gateway` talks to."""
+        with cls._shared_lock:
+            registry = cls._shared.get(gateway.gateway_url)
+            if registry is None:
+                registry = cls._shared[gateway.gateway_url] = cls(gateway)
+            return registry
+
+    def _load(self, function_name):
+        self.fetches += 1
+        spec = LambdaFunction.parse_function(load_function(self.gateway, function_name))
+        with self._lock:
+            self._specs[function_name] = (spec, time.monotonic())
+        return spec
+
+    def _refresh(self, function_name):
+        try:
+            self._load(function_name)
+        except Exception as e:
+            print(f"An error occurred while refreshing function {function_name}: {e}")
+            with self._lock:
+                spec, _ = self._specs[function_name]
+                self._specs[function_name] = (spec, time.monotonic())
+        finally:
+            with self._lock:
+                self._refreshing.discard(function_name)
+
+    def get(self, function_name: str) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._specs.get(function_name)
+            if cached is not None:
+                spec, loaded_at = cached
+                if time.monotonic() - loaded_at > self.ttl and function_name not in self._refreshing:
+                    self._refreshing.add(function_name)
+                    threading.Thread(target=self._refresh, args=(function_name,), daemon=True).start()
+                return spec
+        return self._load(function_name)
+
+    def preload(self) -> None:
+        """Fetch and parse every function of the dashboard at once."""
+        self.fetches += 1
+        functions = self.gateway.get_all() or {}
+        now = time.monotonic()
+        specs = {}
+        for name, function in functions.items():
+            try:
+                specs[name] = (LambdaFunction.parse_function(function), now)
+            except (KeyError, ValueError) as e:
+                print(f"An error occurred while parsing function {name}: {e}")
+        with self._lock:
+            self._specs.update(specs)
+
+    def invalidate(self, function_name: str = None) -> None:
+        with self._lock:
+            if function_name is None:
+                self._specs.clear()
+            else:
+                self._specs.pop(function_name, None)
 
 
 class LambdaFunction:
-    def __init__(self, gateway: LambdaGateway, function_name: str):
+    """A deployed Nuclio function.
+
+    `transport` selects the request body: "json" (base64 image in a JSON object), "binary" (the
+    encoded image as the body, Content-Type from the profile's encode_format, parameters in
+    X-Param-* headers) or "msgpack" (one map with the image as bytes). "binary" and "msgpack" need
+    functions that decode them (serverless/common/transport.py).
+
+    The parsed spec (id, kind, labels, ...) comes from the process-wide FunctionRegistry of the
+    gateway, so creating a handle does not call the dashboard once the spec is cached. The
+    labels and attributes are shared between handles and must not be modified.
+
+    `profile` (by default PROFILES[function name], else the full frame as JPEG) sets how images
+    are downscaled and encoded before sending; coordinates in the response are mapped back to
+    the original image.
+    """
+    def __init__(self, gateway: Union[LambdaGateway, AsyncLambdaGateway], function_name: str, transport: str = None,
+                 profile: ImageProfile = None, registry: "FunctionRegistry" = None):
         self.gateway = gateway
-        function = self.load_function(function_name=function_name)
-
+        self.transport = transport or Config.nuclio.NUCLIO_TRANSPORT
+        if self.transport not in TRANSPORTS:
+            raise ValueError(f"transport must be one of {TRANSPORTS}")
+        registry = registry or FunctionRegistry.for_gateway(gateway)
+        self.__dict__.update(registry.get(function_name))
+        self.profile = profile or PROFILES.get(self.id, ImageProfile())
+
+    @classmethod
+    def parse_function(cls, function: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields of a handle parsed from the dashboard's function description."""
+        self = cls.__new__(cls)
+        self._parse(function)
+        return vars(self)
+
+    def _parse(self, function):
         # ID of the function (e.g. omz.public.yolo-v3)
         self.id = function['metadata']['name']
         # type of the function (e.g. detector, interactor)
@@ -138,12 +479,7 @@ class LambdaFunction:
         self.help_message = meta_anno.get('help_message', '')
 
     def load_function(self, function_name: str):
-        try:
-            function = self.gateway.get(func_id=function_name)
-            return function
-        except Exception as e:
-            raise Exception("Can not connect to function", e)
-            exit()
+        return load_function(self.gateway, function_name)
 
     def to_dict(self):
         response = {
@@ -197,29 +533,135 @@ class LambdaFunction:
 
     def invoke(
         self,
-        data: Dict[str, Any] = None
+        data: Dict[str, Any] = None,
+        retries: bool = True
     ):
+        return self._send(self._prepare(data), retries=retries)
+
+    def _prepare(self, data: Dict[str, Any]):
+        """(payload, body, headers, scale) of an invocation with `data`; the image is encoded here."""
         payload = {}
         data = {k: v for k, v in data.items() if v is not None}
 
         threshold = data.get("threshold")
         if threshold:
             payload.update({"threshold": threshold})
+        if data.get("text"):
+            payload.update({"text": data["text"]})
 
         # model_labels = self.labels
 
         image = data.get("image")
-        if image is not None:
+        if image is None:
+            return payload, None, None, None
+
+        encoded, scale = self.profile.prepare(image)
+        if self.transport == "json":
             payload.update({
-                "image": self._get_image(image)
+                "image": base64.b64encode(encoded).decode('utf-8')
             })
-
-        response = self.gateway.invoke(self, payload)
-
-        return response
-
-    def _get_image(self, image: np.array, encode_format=".jpg"):
-        if not isinstance(image, np.ndarray):
-            raise ValueError("image must be a numpy array")
-        _, im_arr = cv2.imencode(encode_format, image)
-        return base64.b64encode(im_arr.tobytes()).decode('utf-8')
+            return payload, None, None, scale
+        if self.transport == "binary":
+            headers = {'Content-Type': self.profile.content_type}
+            headers.update({f'X-Param-{key}': quote(str(value)) for key, value in payload.items()})
+            return None, encoded, headers, scale
+        import msgpack  # only needed by the msgpack transport
+        payload.update({"image": encoded})
+        return None, msgpack.packb(payload), {'Content-Type': 'application/msgpack'}, scale
+
+    def _send(self, request, retries: bool = True):
+        payload, body, headers, scale = request
+        response = self.gateway.invoke(self, payload, body=body, headers=headers, retries=retries)
+        if scale is None:
+            return response
+        if asyncio.iscoroutine(response):  # AsyncLambdaGateway
+            async def restored():
+                return self.profile.restore(await response, scale)
+            return restored()
+        return self.profile.restore(response, scale)
+
+    def invoke_many(
+        self,
+        images: Iterable[Any],
+        concurrency: int = 8,
+        ordered: bool = False,
+        threshold: float = None,
+        max_attempts: int = None,
+    ) -> Iterator[Tuple[int, Any, Exception]]:
+        """Invoke the function on many images with at most `concurrency` requests in flight.
+
+        `images` may be a lazy iterable of numpy arrays or of `invoke` data dicts; it is consumed
+        only as requests are sent. Yields `(index, response, error)` as results complete, or in
+        input order with `ordered=True` (finished results then count against `concurrency` until
+        they can be yielded, so memory stays bounded). Retries happen here only: every request is a
+        single attempt on the gateway's retry-free session, and an item whose request still fails
+        after `max_attempts` connection errors, timeouts or RETRY_STATUSES is yielded with its
+        error instead of stopping the stream. The latency of every HTTP attempt is recorded and its
+        percentiles kept in `self.stats`. Needs a sync LambdaGateway.
+        """
+        if not isinstance(self.gateway, LambdaGateway):
+            raise TypeError("invoke_many needs a LambdaGateway; with an AsyncLambdaGateway, "
+                            "await invoke() coroutines under an asyncio.Semaphore instead")
+        return self._invoke_many(images, concurrency, ordered, threshold, max_attempts)
+
+    def _invoke_many(self, images, concurrency, ordered, threshold, max_attempts):
+        nuclio = Config.nuclio
+        max_attempts = nuclio.NUCLIO_MAX_RETRIES + 1 if max_attempts is None else max_attempts
+        latencies = []
+        self.stats = {}
+
+        def call(item):
+            data = dict(item) if isinstance(item, dict) else {"image": item}
+            if threshold is not None:
+                data.setdefault("threshold", threshold)
+            request = self._prepare(data)  # encoded once, whatever the number of attempts
+            for attempt in range(max_attempts):
+                start = time.perf_counter()
+                try:
+                    response = self._send(request, retries=False)
+                    latencies.append(time.perf_counter() - start)
+                    return response
+                except Exception as e:
+                    latencies.append(time.perf_counter() - start)
+                    if attempt == max_attempts - 1 or not _is_retryable(e):
+                        raise
+                time.sleep(nuclio.NUCLIO_RETRY_BACKOFF * 2 ** attempt)
+
+        def outcome(future):
+            error = future.exception()
+            return (None, error) if error is not None else (future.result(), None)
+
+        start = time.perf_counter()
+        count = 0
+        items = enumerate(images)
+        in_flight = {}
+        done_early = {}  # ordered mode: finished results waiting for earlier indexes
+        next_index = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) + len(done_early) < concurrency:
+                    try:
+                        index, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight[executor.submit(call, item)] = index
+                if not in_flight and not done_early:
+                    break
+                if in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = in_flight.pop(future)
+                        count += 1
+                        if ordered:
+                            done_early[index] = outcome(future)
+                        else:
+                            yield (index, *outcome(future))
+                while next_index in done_early:
+                    yield (next_index, *done_early.pop(next_index))
+                    next_index += 1
+
+        elapsed = time.perf_counter() - start
+        self.stats = {**latency_percentiles(latencies), "items": count, "seconds": round(elapsed, 3),
+                      "items_per_sec": round(count / elapsed, 1) if elapsed else 0.0}
@@ -1,3 +1,4 @@
+import io
 import os
 import uuid
 import json
@@ -10,27 +11,43 @@ from qdrant_client import QdrantClient #type: ignore
 from qdrant_client.models import PointStruct, VectorParams, Distance #type: ignore
 
 from configure import Config
-from database.database import SessionLocal, engine, Base
+from database.database import session_scope, engine, Base
+from database.bulk_writer import BulkWriter
 import database.models as models
-from etl.image_quality import Brightness, Blurriness, Entropy
+from database.image_query import upgrade_image_table
+from etl.image_dedup import ImageHasher, DedupIndex
+from etl.quality_pool import get_quality_pool
 from serverless.task.autolabel.vlm import ObjectLabeler
-from serverless.task.image_embeded_clip.image_feature import ImageFeatureExtractor
-from storage.minio_storage import MinioClientWrapper
+from serverless.task.image_embeded_clip.image_feature import ImageFeatureExtractor, FeatureBatch
+from storage.minio_storage import get_minio_client
+from storage.qdrant_storage import QdrantPointBuffer
 from app.utils.utils import get_file_download_date, crop_image
+from app.utils.manifest import IngestManifest
 
 # Initialize database
 
 class ImageProcessor:
-    def __init__(self, minio_config, db_session, qdrant_url):
+    def __init__(self, minio_config, db_session, qdrant_url, embed_batch_size=16, dedup_distance=4, link_duplicates=True):
         self.auto_label = ObjectLabeler(florence_model_path = "microsoft/Florence-2-base",
                                         config_file = "/home/mq/data_disk2T/Toan/recognize-anything/Grounded-Segment-Anything/GroundingDINO/groundingdino/config/GroundingDINO_SwinT_OGC.py", 
                                         ram_plus_checkpoint = "/home/mq/data_disk2T/Toan/modelsLLM/ram_plus_swin_large_14m.pth", 
                                         grounded_checkpoint = "/home/mq/data_disk2T/Toan/modelsLLM/groundingdino_swint_ogc.pth")
-        self.minio_client = MinioClientWrapper(minio_config['domain'], minio_config['user'], minio_config['password'])
         self.db = db_session
-        self.client = QdrantClient(url=qdrant_url, timeout=60.0)
-        self.feature_extractor = ImageFeatureExtractor()
+        self.client = QdrantClient(url=qdrant_url, timeout=60.0, prefer_grpc=True, grpc_port=Config.qdrant.QDRANT_GRPC_PORT)
+        self.point_buffer = QdrantPointBuffer(
+            self.client,
+            max_points=Config.qdrant.QDRANT_FLUSH_POINTS,
+            max_age=Config.qdrant.QDRANT_FLUSH_SECONDS,
+            parallel=Config.qdrant.QDRANT_UPLOAD_PARALLEL
+        )
+        self.feature_extractor = ImageFeatureExtractor(batch_size=embed_batch_size)
         self.feature_size = 512
+        self.dedup = DedupIndex(db_session, max_distance=dedup_distance)
+        self.link_duplicates = link_duplicates
+        # sha256 by path of the files ingested since the last checkpoint, for IngestManifest.mark_done.
+        self.digests = {}
+        self.quality_pool = get_quality_pool(Config.pipeline.QUALITY_WORKERS)
+        self.db_writer = BulkWriter(batch_rows=Config.pipeline.DB_BATCH_ROWS)
         self._initialize_qdrant_collections()
  
     def _initialize_qdrant_collections(self):
@@ -49,161 +66,257 @@ class ImageProcessor:
         except Exception as e:
             print(f"An error occurred while initializing Qdrant collections: {e}")
 
+    def checkpoint(self):
+        """Write buffered rows and points, then the hashes of their images; only then may the manifest record them.
+
+        Returns {file_path: sha256} of the files ingested since the previous checkpoint.
+        """
+        self.db_writer.flush()
+        self.point_buffer.flush()
+        self.dedup.flush()
+        digests, self.digests = self.digests, {}
+        return digests
+
     def close(self):
-        self.db.close()
+        # The db session belongs to the caller's session_scope and is not closed here.
+        try:
+            self.db_writer.close()
+        finally:
+            self.point_buffer.close()
+        self.dedup.flush()
+
+_processors = {}
+
+def get_processor(minio_config, db_session, qdrant_url, embed_batch_size=16) -> ImageProcessor:
+    """Return the ImageProcessor of the current process for `db_session`, loading the models on first use."""
+    key = (minio_config['domain'], minio_config['user'], qdrant_url, embed_batch_size, db_session)
+    if key not in _processors:
+        _processors[key] = ImageProcessor(minio_config, db_session, qdrant_url, embed_batch_size)
+    return _processors[key]
+
+def close_processors():
+    """Flush and release every processor of the current process; call it before closing their sessions."""
+    while _processors:
+        _, processor = _processors.popitem()
+        processor.close()
 
 @task(name="Extract features")
 def extract_features(img, ip: ImageProcessor):
     return ip.feature_extractor.extract_features_clip(img).tolist()
 
+@task(name="Extract features batch")
+def extract_features_batch(batch: FeatureBatch, ip: ImageProcessor):
+    return batch.run(ip.feature_extractor)
+
 @task(name="Save image to Qdrant", retries=3)
 def save_image_to_qdrant(collection_name: str, points: List[PointStruct], ip: ImageProcessor):
-    try:
-        ip.client.upsert(collection_name=collection_name, points=points)
-    except Exception as e:
-        print(f"An error occurred while uploading to Qdrant: {e}")
+    ip.point_buffer.add(collection_name, points)
+
+@task(name="Bootstrap Minio bucket", retries=3)
+def bootstrap_bucket(task_name, minio_config):
+    get_minio_client(minio_config).ensure_bucket(task_name, public_read=True)
 
 @task(name="Upload to Minio", retries=3)
 def upload_to_minio(file_path, file_name, task_name, minio_config):
-    minio_client = MinioClientWrapper(minio_config['domain'], minio_config['user'], minio_config['password'])
+    minio_client = get_minio_client(minio_config)
+    # The stored /bucket/object URLs must be readable; cached, so only the first call makes requests.
+    minio_client.ensure_bucket(task_name, public_read=True)
     minio_client.upload_object(bucket_name=task_name, file_path=file_path, object_name=file_name)
-    policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": "*",
-                "Action": ["s3:GetObject"],
-                "Resource": [f"arn:aws:s3:::{task_name}/*"]
-            }
-        ]
-    }
-    policy_str = json.dumps(policy)
-    minio_client.set_bucket_policy(task_name, policy_str)
-    url_image = minio_client.get_url_object(bucket_name=task_name, object_name=file_name)
-    url_image_shorted = ""
-    for item in url_image.split("?")[0].split('://')[1].split('/')[1:]:
-            url_image_shorted += '/' + item
-    return url_image_shorted
-
-@task(name="Get metrics", retries=3)
-def calculate_metrics(img):
-    dark_score = Brightness.calculate_brightness_score(img)['brightness_perc_95']
-    blur_score = Blurriness.calculate_blurriness_score(img)
-    light_score = 1 - Brightness.calculate_brightness_score(img)['brightness_perc_5']
-    low_information_score = Entropy.calc_entropy_score(img)
-    metrics = {
-        "dark_score": dark_score,
-        "light_score": light_score,
-        "low_information_score": low_information_score,
-        "blur_score": blur_score
-    }
-    return metrics
+    return minio_client.get_path_object(bucket_name=task_name, object_name=file_name)
 
 @task(name=f"Save to PostgreSQL", retries=3)
-def save_image_to_db(id_image, url_image, description, metadata, metrics, db_session):
-    image = models.Image(
+def save_image_to_db(id_image, url_image, description, metadata, metrics, ip: ImageProcessor):
+    ip.db_writer.add_image(
         id=id_image,
         url=url_image,
         description=description,
         meta_data=metadata,
         metric=metrics
     )
-    db_session.add(image)
-    db_session.commit()
 
-@task(name="Process image", retries=3)
-def process_image(file_path, file_name, task_name, minio_config, qdrant_url, db_session):
-    processor = ImageProcessor(minio_config, db_session, qdrant_url)
-    img = Image.open(file_path)
-    width, height = img.size
+def ingest_images(processor: ImageProcessor, items, task_name, minio_config):
+    """Run every ingestion stage for a group of (file_path, file_name) items.
 
-    url_image = upload_to_minio(file_path, file_name, task_name, minio_config)
+    Exact and near-duplicates of already ingested images are skipped before any upload or model
+    run. Whole images and their detected crops from the whole group are embedded together, so the
+    CLIP model runs on full batches instead of one image at a time.
+    """
+    ids = []
+    digests = {}
+    mark = processor.dedup.mark()
+    try:
+        _ingest_group(processor, items, task_name, minio_config, ids, digests)
+    except Exception:
+        processor.dedup.discard_pending(mark)
+        processor.quality_pool.discard(ids)
+        raise
+    # The hashes stay pending until processor.checkpoint() has written the group's rows and points.
+    processor.digests.update(digests)
 
-    id_image = uuid.uuid4().hex
-    feature_vector = extract_features(img, processor)
+def skip_duplicate(processor, file_path, sha256, phash) -> bool:
+    """Check the dedup index; a duplicate is skipped and, if enabled, linked to its original image."""
+    duplicate = processor.dedup.lookup(sha256, phash)
+    if duplicate is None:
+        return False
+    kind, id_original, distance = duplicate
+    if processor.link_duplicates:
+        processor.dedup.link(id_original, sha256, phash, file_path, distance)
+    print(f"Skipping {kind} duplicate {file_path} of image {id_original} (distance {distance})")
+    return True
 
-    qdrant_image = PointStruct(
-        id=id_image,
-        vector=feature_vector,
-        payload={"id_image": id_image}
-    )
-    
-    save_image_to_qdrant("image_collection", [qdrant_image], processor)
-
-    description = processor.auto_label.get_description(img)
-    date_time = get_file_download_date(file_path)
-    metrics = calculate_metrics(img)
-    metadata = {
-        "date_time": date_time,
-        "local_path": file_path,
-        "task": task_name,
-        "size": "{}x{}".format(width, height)
-    }
-    save_image_to_db(id_image, url_image, description, metadata, metrics, db_session)
-
-    objects = processor.auto_label.label_image_all(img)
-    
-    id_objects = []
-    features = []
-    for obj in objects:
-        for class_name, bbox in obj.items():
-            x1, y1, x2, y2 = bbox
-            
-            cr_img = crop_image(img, (x1, y1, x2, y2))
-            
-            cr_ft = np.array(extract_features(cr_img, processor)).tolist()
-            features.append(cr_ft)
-            bbox_json = json.dumps(bbox.tolist())
-            id_object = uuid.uuid4().hex
-            id_objects.append(id_object)
-            obj_instance = models.Object(
+def _ingest_group(processor: ImageProcessor, items, task_name, minio_config, ids, digests):
+    batch = FeatureBatch()
+    records = []
+    annotations = []
+    for file_path, file_name in items:
+        with open(file_path, "rb") as f:
+            data = f.read()
+        img = Image.open(io.BytesIO(data))
+        width, height = img.size
+
+        sha256 = digests[file_path] = ImageHasher.sha256(data)
+        phash = ImageHasher.phash(img)
+        if skip_duplicate(processor, file_path, sha256, phash):
+            continue
+
+        id_image = uuid.uuid4().hex
+        ids.append(id_image)
+        processor.dedup.add(id_image, sha256, phash, file_path)
+        # Quality metrics run in the quality process pool while the models label the group.
+        processor.quality_pool.submit(id_image, img)
+
+        url_image = upload_to_minio.fn(file_path, file_name, task_name, minio_config)
+
+        batch.add(id_image, img)
+
+        description = processor.auto_label.get_description(img)
+        date_time = get_file_download_date(file_path)
+        metadata = {
+            "date_time": date_time,
+            "local_path": file_path,
+            "task": task_name,
+            "size": "{}x{}".format(width, height)
+        }
+
+        objects = processor.auto_label.label_image_all(img)
+
+        id_objects = []
+        for obj in objects:
+            for class_name, bbox in obj.items():
+                x1, y1, x2, y2 = bbox
+
+                id_object = uuid.uuid4().hex
+                batch.add(id_object, crop_image(img, (x1, y1, x2, y2)))
+                id_objects.append(id_object)
+                annotations.append(dict(
+                    id=id_object,
+                    image_id=id_image,
+                    label_id=processor.db_writer.label_id(class_name),
+                    bbox=bbox.tolist()
+                ))
+        records.append((id_image, id_objects, url_image, description, metadata))
+
+    features = extract_features_batch.fn(batch, processor)
+
+    metrics = processor.quality_pool.results(ids)
+    for id_image, _, url_image, description, metadata in records:
+        save_image_to_db.fn(id_image, url_image, description, metadata, metrics[id_image], processor)
+    for annotation in annotations:
+        processor.db_writer.add_annotation(**annotation)
+
+    qdrant_images = []
+    qdrant_objects = []
+    for id_image, id_objects, _, _, _ in records:
+        qdrant_images.append(PointStruct(
+            id=id_image,
+            vector=features[id_image],
+            payload={"id_image": id_image}
+        ))
+        qdrant_objects.extend(
+            PointStruct(
                 id=id_object,
-                image_id=id_image,
-                class_name=class_name,
-                bbox=bbox_json
+                vector=features[id_object],
+                payload={"id_image": id_image, "id_object": id_object}
             )
-            db_session.add(obj_instance)
-            
-    qdrant_objects = [
-        PointStruct(
-            id=id_object,
-            vector=feature,
-            payload={"id_image": id_image, "id_object": id_object}
+            for id_object in id_objects
         )
-        for feature, id_object in zip(features, id_objects)
-    ]
-    
-    save_image_to_qdrant(collection_name="object_collection", points=qdrant_objects, ip=processor)
-    db_session.commit()
-    processor.close()
-
-@task(name="Create session database")
+
+    save_image_to_qdrant.fn("image_collection", qdrant_images, processor)
+    save_image_to_qdrant.fn(collection_name="object_collection", points=qdrant_objects, ip=processor)
+
+@task(name="Process image", retries=3)
+def process_image(file_path, file_name, task_name, minio_config, qdrant_url, db_session):
+    processor = get_processor(minio_config, db_session, qdrant_url)
+    ingest_images(processor, [(file_path, file_name)], task_name, minio_config)
+
+@task(name="Process image batch", retries=3)
+def process_image_batch(items, task_name, minio_config, qdrant_url, db_session, embed_batch_size=16):
+    processor = get_processor(minio_config, db_session, qdrant_url, embed_batch_size)
+    ingest_images(processor, items, task_name, minio_config)
+
+@task(name="Create config")
 def create_config():
-    db_session = SessionLocal()
     minio_config = {
         'domain': Config.minio.MINIO_DOMAIN,
         'user': Config.minio.MINIO_USER,
         'password': Config.minio.MINIO_PASSWORD
     }
     qdrant_url = f"http://{Config.qdrant.QDRANT_HOST}:{Config.qdrant.QDRANT_PORT}"
-    return minio_config, qdrant_url, db_session
+    return minio_config, qdrant_url
 
 @task(name="Process images in folder")
-def process_images_in_folder(folder_path, task_name, minio_config, db_session, qdrant_url):
+def process_images_in_folder(folder_path, task_name, minio_config, db_session, qdrant_url, images_per_batch=8, embed_batch_size=16,
+                             manifest_path=None, dry_run=False, checkpoint_every=256):
+    """Ingest a folder group by group.
+
+    A checkpoint (DB rows, Qdrant points, dedup hashes, then manifest append with `manifest_path`)
+    is written every `checkpoint_every` images, so the bulk writer and the point buffer still
+    batch across groups. With `manifest_path`, only new or changed files are processed and a
+    restart resumes from the last checkpoint. `dry_run` only reports what would be processed.
+    """
+    items = []
     for file_name in os.listdir(folder_path):
         file_path = os.path.join(folder_path, file_name)
         if os.path.isfile(file_path):
-            process_image(file_path, file_name, task_name, minio_config, qdrant_url, db_session)
+            items.append((file_path, file_name))
+    manifest = None
+    if manifest_path is not None:
+        manifest = IngestManifest(manifest_path)
+        items, processed = manifest.plan(items)
+        if dry_run:
+            print(f"Dry run: {json.dumps(manifest.report(items, processed))}")
+    elif dry_run:
+        print(f"Dry run: {len(items)} files to process")
+    if dry_run:
+        return items
+    bootstrap_bucket(task_name, minio_config)
+    processor = get_processor(minio_config, db_session, qdrant_url, embed_batch_size)
+    for i in range(0, len(items), images_per_batch):
+        batch_items = items[i:i + images_per_batch]
+        process_image_batch(batch_items, task_name, minio_config, qdrant_url, db_session, embed_batch_size)
+        if len(processor.digests) >= checkpoint_every:
+            # Rows and points of the files must be written before the manifest records them.
+            digests = processor.checkpoint()
+            if manifest is not None:
+                manifest.mark_done(digests)
+    if processor.digests:
+        digests = processor.checkpoint()
+        if manifest is not None:
+            manifest.mark_done(digests)
+    return items
 
 @flow(name="Main Process")
-def main_process():
-    minio_config, qdrant_url, db_session = create_config()
-    try:
-        process_images_in_folder("/home/mq/data_disk2T/Data-Recall-System/images/test", "test", minio_config, db_session, qdrant_url)
-    finally:
-        db_session.close()
+def main_process(dry_run: bool = False):
+    minio_config, qdrant_url = create_config()
+    manifest_path = os.path.join(".manifests", "test.jsonl")
+    with session_scope() as db_session:
+        try:
+            process_images_in_folder("/home/mq/data_disk2T/Data-Recall-System/images/test", "test", minio_config, db_session, qdrant_url,
+                                     manifest_path=manifest_path, dry_run=dry_run)
+        finally:
+            close_processors()
 
 if __name__ == "__main__":
     Base.metadata.create_all(engine)
+    upgrade_image_table(engine)
     main_process()
@@ -1,6 +1,9 @@
+import io
 import os
 import uuid
 import json
+import time
+import multiprocessing as mp
 from typing import List
 
 import numpy as np
@@ -10,20 +13,36 @@ from qdrant_client import QdrantClient #type: ignore
 from qdrant_client.models import PointStruct, VectorParams, Distance #type: ignore
 
 from configure import Config
+from database.database import SessionLocal, engine, Base
 import database.models as models
-from etl.image_quality import Brightness, Blurriness, Entropy
-from serverless.task.image_embeded_clip.image_feature import ImageFeatureExtractor
-from storage.minio_storage import MinioClientWrapper
-from utils.utils import get_file_download_date, crop_image
+from database.image_query import upgrade_image_table
+from etl.image_dedup import ImageHasher, DedupIndex
+from etl.quality_pool import get_quality_pool
+from serverless.task.image_embeded_clip.image_feature import ImageFeatureExtractor, FeatureBatch
+from storage.minio_storage import get_minio_client
+from storage.qdrant_storage import QdrantPointBuffer
+from utils.utils import get_file_download_date, crop_image, StageTimer, PoolResults
+from utils.manifest import IngestManifest
 from ultralytics import YOLO
 
 class ImageProcessor:
-    def __init__(self, minio_config, qdrant_url):
+    def __init__(self, minio_config, qdrant_url, embed_batch_size=16, dedup_distance=4, link_duplicates=True):
         self.auto_label = YOLO('/home/mq/data_disk2T/Data-Recall-System/weights/best.pt')
-        self.minio_client = MinioClientWrapper(minio_config['domain'], minio_config['user'], minio_config['password'])
-        self.client = QdrantClient(url=qdrant_url, timeout=60.0)
-        self.feature_extractor = ImageFeatureExtractor()
+        self.client = QdrantClient(url=qdrant_url, timeout=60.0, prefer_grpc=True, grpc_port=Config.qdrant.QDRANT_GRPC_PORT)
+        self.point_buffer = QdrantPointBuffer(
+            self.client,
+            max_points=Config.qdrant.QDRANT_FLUSH_POINTS,
+            max_age=Config.qdrant.QDRANT_FLUSH_SECONDS,
+            parallel=Config.qdrant.QDRANT_UPLOAD_PARALLEL
+        )
+        self.feature_extractor = ImageFeatureExtractor(batch_size=embed_batch_size)
         self.feature_size = 512
+        self.db = SessionLocal()
+        self.dedup = DedupIndex(self.db, max_distance=dedup_distance)
+        self.link_duplicates = link_duplicates
+        # sha256 by path of the files ingested since the last checkpoint, for IngestManifest.mark_done.
+        self.digests = {}
+        self.quality_pool = get_quality_pool(Config.pipeline.QUALITY_WORKERS)
         self._initialize_qdrant_collections()
  
     def _initialize_qdrant_collections(self):
@@ -42,110 +61,210 @@ class ImageProcessor:
         except Exception as e:
             print(f"An error occurred while initializing Qdrant collections: {e}")
 
+    def checkpoint(self):
+        """Write buffered points, then the hashes of their images; only then may the manifest record them.
+
+        Returns {file_path: sha256} of the files ingested since the previous checkpoint.
+        """
+        self.point_buffer.flush()
+        self.dedup.flush()
+        digests, self.digests = self.digests, {}
+        return digests
+
     def close(self):
-        pass 
+        try:
+            self.point_buffer.close()
+            self.dedup.flush()
+        finally:
+            self.db.close()
+
+_processors = {}
+
+def get_processor(minio_config, qdrant_url, embed_batch_size=16) -> ImageProcessor:
+    """Return the ImageProcessor of the current process, loading the models on first use."""
+    key = (minio_config['domain'], minio_config['user'], qdrant_url, embed_batch_size)
+    if key not in _processors:
+        _processors[key] = ImageProcessor(minio_config, qdrant_url, embed_batch_size)
+    return _processors[key]
+
+def close_processors():
+    """Flush and release every processor of the current process."""
+    while _processors:
+        _, processor = _processors.popitem()
+        processor.close()
 
 @task(name="Extract features")
 def extract_features(img, ip: ImageProcessor):
     return ip.feature_extractor.extract_features_clip(img).tolist()
 
+@task(name="Extract features batch")
+def extract_features_batch(batch: FeatureBatch, ip: ImageProcessor):
+    return batch.run(ip.feature_extractor)
+
 @task(name="Save image to Qdrant", retries=3)
 def save_image_to_qdrant(collection_name: str, points: List[PointStruct], ip: ImageProcessor):
-    try:
-        ip.client.upsert(collection_name=collection_name, points=points)
-    except Exception as e:
-        print(f"An error occurred while uploading to Qdrant: {e}")
+    ip.point_buffer.add(collection_name, points)
+
+@task(name="Bootstrap Minio bucket", retries=3)
+def bootstrap_bucket(task_name, minio_config):
+    get_minio_client(minio_config).ensure_bucket(task_name, public_read=True)
 
 @task(name="Upload to Minio", retries=3)
 def upload_to_minio(file_path, file_name, task_name, minio_config):
-    minio_client = MinioClientWrapper(minio_config['domain'], minio_config['user'], minio_config['password'])
+    minio_client = get_minio_client(minio_config)
+    # The stored /bucket/object URLs must be readable; cached, so only the first call makes requests.
+    minio_client.ensure_bucket(task_name, public_read=True)
     minio_client.upload_object(bucket_name=task_name, file_path=file_path, object_name=file_name)
-    policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": "*",
-                "Action": ["s3:GetObject"],
-                "Resource": [f"arn:aws:s3:::{task_name}/*"]
-            }
-        ]
-    }
-    policy_str = json.dumps(policy)
-    minio_client.set_bucket_policy(task_name, policy_str)
-    url_image = minio_client.get_url_object(bucket_name=task_name, object_name=file_name)
-    url_image_shorted = ""
-    for item in url_image.split("?")[0].split('://')[1].split('/')[1:]:
-            url_image_shorted += '/' + item
-    return url_image_shorted
-
-@task(name="Get metrics", retries=3)
-def calculate_metrics(img):
-    dark_score = Brightness.calculate_brightness_score(img)['brightness_perc_95']
-    blur_score = Blurriness.calculate_blurriness_score(img)
-    light_score = 1 - Brightness.calculate_brightness_score(img)['brightness_perc_5']
-    low_information_score = Entropy.calc_entropy_score(img)
-    metrics = {
-        "dark_score": dark_score,
-        "light_score": light_score,
-        "low_information_score": low_information_score,
-        "blur_score": blur_score
-    }
-    return metrics
+    return minio_client.get_path_object(bucket_name=task_name, object_name=file_name)
+
+def skip_duplicate(processor, file_path, sha256, phash) -> bool:
+    """Check the dedup index; a duplicate is skipped and, if enabled, linked to its original image."""
+    duplicate = processor.dedup.lookup(sha256, phash)
+    if duplicate is None:
+        return False
+    kind, id_original, distance = duplicate
+    if processor.link_duplicates:
+        processor.dedup.link(id_original, sha256, phash, file_path, distance)
+    print(f"Skipping {kind} duplicate {file_path} of image {id_original} (distance {distance})")
+    return True
+
+def ingest_images(processor: ImageProcessor, items, task_name, minio_config, timer: StageTimer = None):
+    """Run every ingestion stage for a group of (file_path, file_name) items.
+
+    Exact and near-duplicates of already ingested images are skipped before any upload or model
+    run. Whole images and their YOLO crops from the whole group are embedded together, so the
+    CLIP model runs on full batches instead of one image at a time.
+    """
+    timer = timer if timer is not None else StageTimer()
+    ids = []
+    digests = {}
+    mark = processor.dedup.mark()
+    try:
+        _ingest_group(processor, items, task_name, minio_config, timer, ids, digests)
+    except Exception:
+        processor.dedup.discard_pending(mark)
+        processor.quality_pool.discard(ids)
+        raise
+    # The hashes stay pending until processor.checkpoint() has written the group's points.
+    processor.digests.update(digests)
+    return timer
+
+def _ingest_group(processor: ImageProcessor, items, task_name, minio_config, timer: StageTimer, ids, digests):
+    batch = FeatureBatch()
+    records = []
+    for file_path, file_name in items:
+        with timer.stage("decode"):
+            with open(file_path, "rb") as f:
+                data = f.read()
+            img = Image.open(io.BytesIO(data))
+            img.load()
+            width, height = img.size
+
+        with timer.stage("dedup"):
+            sha256 = digests[file_path] = ImageHasher.sha256(data)
+            phash = ImageHasher.phash(img)
+            if skip_duplicate(processor, file_path, sha256, phash):
+                continue
+
+        id_image = uuid.uuid4().hex
+        ids.append(id_image)
+        processor.dedup.add(id_image, sha256, phash, file_path)
+        # Quality metrics run in the quality process pool while the rest of the group is processed.
+        with timer.stage("metrics"):
+            processor.quality_pool.submit(id_image, img)
+
+        with timer.stage("upload"):
+            url_image = upload_to_minio.fn(file_path, file_name, task_name, minio_config)
+
+        batch.add(id_image, img)
+
+        description = "Description: "
+        date_time = get_file_download_date(file_path)
+        metadata = {
+            "date_time": date_time,
+            "local_path": file_path,
+            "task": task_name,
+            "size": "{}x{}".format(width, height)
+        }
+
+        with timer.stage("detect"):
+            objects = processor.auto_label(img)
+
+        id_objects = []
+        for bbox in objects[0].boxes.xyxy:
+            x1, y1, x2, y2 = bbox
+            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+
+            id_object = uuid.uuid4().hex
+            batch.add(id_object, crop_image(img, (x1, y1, x2, y2)))
+            id_objects.append(id_object)
+        records.append((id_image, id_objects))
+
+    with timer.stage("embed"):
+        features = extract_features_batch.fn(batch, processor)
+
+    with timer.stage("metrics"):
+        metrics = processor.quality_pool.results(ids)
+
+    qdrant_images = []
+    qdrant_objects = []
+    for id_image, id_objects in records:
+        qdrant_images.append(PointStruct(
+            id=id_image,
+            vector=features[id_image],
+            payload={"id_image": id_image}
+        ))
+        qdrant_objects.extend(
+            PointStruct(
+                id=id_object,
+                vector=features[id_object],
+                payload={"id_image": id_image, "id_object": id_object}
+            )
+            for id_object in id_objects
+        )
+
+    with timer.stage("qdrant"):
+        save_image_to_qdrant.fn("image_collection", qdrant_images, processor)
+        save_image_to_qdrant.fn(collection_name="object_collection", points=qdrant_objects, ip=processor)
 
 @task(name="Process image", retries=3)
 def process_image(file_path, file_name, task_name, minio_config, qdrant_url):
-    processor = ImageProcessor(minio_config, qdrant_url)
-    img = Image.open(file_path)
-    width, height = img.size
-
-    url_image = upload_to_minio(file_path, file_name, task_name, minio_config)
-
-    id_image = uuid.uuid4().hex
-    feature_vector = extract_features(img, processor)
-
-    qdrant_image = PointStruct(
-        id=id_image,
-        vector=feature_vector,
-        payload={"id_image": id_image}
-    )
-    
-    save_image_to_qdrant("image_collection", [qdrant_image], processor)
-    description = "Description: "
-    date_time = get_file_download_date(file_path)
-    metrics = calculate_metrics(img)
-    metadata = {
-        "date_time": date_time,
-        "local_path": file_path,
-        "task": task_name,
-        "size": "{}x{}".format(width, height)
-    }
+    processor = get_processor(minio_config, qdrant_url)
+    ingest_images(processor, [(file_path, file_name)], task_name, minio_config)
 
-    objects = processor.auto_label(img)
-    
-    id_objects = []
-    features = []
-    for bbox in objects[0].boxes.xyxy:
-        x1, y1, x2, y2 = bbox
-        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-   
-        cr_img = crop_image(img, (x1, y1, x2, y2))
-        cr_ft = np.array(extract_features(cr_img, processor)).tolist()
-        features.append(cr_ft)
-        
-        id_object = uuid.uuid4().hex
-        id_objects.append(id_object)
-        
-    qdrant_objects = [
-        PointStruct(
-            id=id_object,
-            vector=feature,
-            payload={"id_image": id_image, "id_object": id_object}
-        )
-        for feature, id_object in zip(features, id_objects)
-    ]
-    save_image_to_qdrant(collection_name="object_collection", points=qdrant_objects, ip=processor)
-    processor.close()
+@task(name="Process image batch", retries=3)
+def process_image_batch(items, task_name, minio_config, qdrant_url, embed_batch_size=16):
+    processor = get_processor(minio_config, qdrant_url, embed_batch_size)
+    ingest_images(processor, items, task_name, minio_config)
+
+def _ingest_worker(task_queue, result_queue, task_name, minio_config, qdrant_url, embed_batch_size, checkpoint_every):
+    """Worker process: load the models once, then ingest groups of files until a None sentinel arrives.
+
+    Every result carries {file_path: sha256} of the files whose Qdrant points are known to be
+    written (`durable`), which is what the manifest may record; the rest is reported once the
+    final flush succeeds.
+    """
+    processor = ImageProcessor(minio_config, qdrant_url, embed_batch_size)
+    try:
+        while True:
+            items = task_queue.get()
+            if items is None:
+                break
+            file_paths = [file_path for file_path, _ in items]
+            timer = StageTimer()
+            error = None
+            durable = {}
+            try:
+                ingest_images(processor, items, task_name, minio_config, timer)
+                if len(processor.digests) >= checkpoint_every:
+                    durable = processor.checkpoint()
+            except Exception as e:
+                error = repr(e)
+            result_queue.put((file_paths, durable, dict(timer.totals), error))
+        durable = processor.checkpoint()
+    finally:
+        processor.close()
+    result_queue.put(([], durable, {}, None))
 
 @task(name="Create session database")
 def create_config():
@@ -157,17 +276,126 @@ def create_config():
     qdrant_url = f"http://{Config.qdrant.QDRANT_HOST}:{Config.qdrant.QDRANT_PORT}"
     return minio_config, qdrant_url
 
-@task(name="Process images in folder")
-def process_images_in_folder(folder_path, task_name, minio_config, qdrant_url):
+def list_image_files(folder_path):
+    files = []
     for file_name in os.listdir(folder_path):
         file_path = os.path.join(folder_path, file_name)
         if os.path.isfile(file_path):
-            process_image(file_path, file_name, task_name, minio_config, qdrant_url)
+            files.append((file_path, file_name))
+    return files
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def plan_folder(folder_path, manifest_path=None, dry_run=False):
+    """List the files to ingest, leaving out those the manifest already records as processed."""
+    files = list_image_files(folder_path)
+    if manifest_path is None:
+        if dry_run:
+            print(f"Dry run: {len(files)} files to process")
+        return files, None
+    manifest = IngestManifest(manifest_path)
+    files, processed = manifest.plan(files)
+    if dry_run:
+        print(f"Dry run: {json.dumps(manifest.report(files, processed))}")
+    else:
+        print(f"Skipping {len(processed)} already processed files, {len(files)} to process")
+    return files, manifest
+
+@task(name="Process images in folder")
+def process_images_in_folder(folder_path, task_name, minio_config, qdrant_url, images_per_batch=8, embed_batch_size=16,
+                             manifest_path=None, dry_run=False, checkpoint_every=256):
+    """Ingest a folder group by group.
+
+    A checkpoint (Qdrant flush, dedup hashes, then manifest append with `manifest_path`) is written
+    every `checkpoint_every` images. With `manifest_path`, only new or changed files are processed,
+    so a restart resumes from the last checkpoint.
+    `dry_run` only reports what would be processed.
+    """
+    files, manifest = plan_folder(folder_path, manifest_path, dry_run)
+    if dry_run:
+        return files
+    bootstrap_bucket(task_name, minio_config)
+    processor = get_processor(minio_config, qdrant_url, embed_batch_size)
+    for items in chunked(files, images_per_batch):
+        process_image_batch(items, task_name, minio_config, qdrant_url, embed_batch_size)
+        if len(processor.digests) >= checkpoint_every:
+            digests = processor.checkpoint()
+            if manifest is not None:
+                manifest.mark_done(digests)
+    if processor.digests:
+        digests = processor.checkpoint()
+        if manifest is not None:
+            manifest.mark_done(digests)
+    return files
+
+@task(name="Process images in folder with worker pool")
+def process_images_in_folder_pool(folder_path, task_name, minio_config, qdrant_url, num_workers=2,
+                                  images_per_batch=8, embed_batch_size=16, manifest_path=None, dry_run=False,
+                                  checkpoint_every=256):
+    """Ingest a folder with `num_workers` processes that each load YOLO, CLIP and Qdrant once.
+
+    Workers pull groups of `images_per_batch` files from a queue and embed each group in CLIP runs
+    of `embed_batch_size`. `manifest_path`, `dry_run` and `checkpoint_every` behave as in
+    process_images_in_folder. Returns a throughput report with images/sec and mean per-stage latency;
+    files not acknowledged as written by a worker are counted as failed.
+
+    Each worker has its own DedupIndex, loaded when it starts: duplicates of images ingested in
+    earlier runs are skipped, but two copies of an image handed to different workers in the same
+    run are both ingested.
+    """
+    files, manifest = plan_folder(folder_path, manifest_path, dry_run)
+    if dry_run:
+        return {"to_process": len(files)}
+    bootstrap_bucket(task_name, minio_config)
+    ctx = mp.get_context("spawn")
+    task_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    for items in chunked(files, images_per_batch):
+        task_queue.put(items)
+    for _ in range(num_workers):
+        task_queue.put(None)
+
+    start = time.perf_counter()
+    workers = [
+        ctx.Process(target=_ingest_worker, args=(task_queue, result_queue, task_name, minio_config, qdrant_url,
+                                                 embed_batch_size, checkpoint_every))
+        for _ in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    results = PoolResults(manifest)
+    results.drain(result_queue, workers)
+    for worker in workers:
+        worker.join()
+
+    # Files never acknowledged as written were lost with a crashed worker (or never picked up
+    # because every worker died): they count as failed and are not in the manifest.
+    lost = results.lost(file_path for file_path, _ in files)
+    if lost:
+        print(f"{len(lost)} files were not processed, workers exited with codes {[w.exitcode for w in workers]}")
+    report = results.timer.report(len(results.written), time.perf_counter() - start)
+    report["failed"] = len(results.failed | lost)
+    print(f"Throughput report: {json.dumps(report)}")
+    return report
 
 @flow(name="Main Process")
-def main_process():
+def main_process(num_workers: int = 0, dry_run: bool = False):
     minio_config, qdrant_url = create_config()
-    process_images_in_folder("/home/mq/data_disk2T/Data-Recall-System/images/test", "test", minio_config, qdrant_url)
+    folder_path = "/home/mq/data_disk2T/Data-Recall-System/images/test"
+    manifest_path = os.path.join(".manifests", "test.jsonl")
+    try:
+        if num_workers > 0:
+            process_images_in_folder_pool(folder_path, "test", minio_config, qdrant_url, num_workers,
+                                          manifest_path=manifest_path, dry_run=dry_run)
+        else:
+            process_images_in_folder(folder_path, "test", minio_config, qdrant_url,
+                                     manifest_path=manifest_path, dry_run=dry_run)
+    finally:
+        close_processors()
 
 if __name__ == "__main__":
+    Base.metadata.create_all(engine)
+    upgrade_image_table(engine)
     main_process()
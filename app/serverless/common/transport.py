@@ -0,0 +1,33 @@
+"""Request decoding shared by the functions in serverless/task.
+
+Each function image is built from its own directory, so start_serverless.sh copies this file into
+every function directory before `nuctl deploy`; handlers import it as `from transport import ...`.
+Edit it here, never the copies.
+"""
+import base64
+import json
+from urllib.parse import unquote
+
+import cv2
+import msgpack
+import numpy as np
+
+
+def decode_request(event):
+    """(image, params) of an invocation. The body is either the encoded image (Content-Type image/*,
+    params in X-Param-* headers), a msgpack map with the image as bytes, or the legacy JSON object
+    with a base64 image."""
+    headers = {key.lower(): value for key, value in (event.headers or {}).items()}
+    content_type = (getattr(event, 'content_type', None) or headers.get('content-type', '')).split(';')[0].strip()
+    body = event.body
+    if content_type.startswith('image/'):
+        params = {key[len('x-param-'):]: unquote(value) for key, value in headers.items() if key.startswith('x-param-')}
+        data = body
+    elif content_type == 'application/msgpack':
+        params = msgpack.unpackb(body, raw=False)
+        data = params.pop('image')
+    else:
+        params = dict(body) if isinstance(body, dict) else json.loads(body)
+        data = base64.b64decode(params.pop('image'))
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return image, params
@@ -4,6 +4,8 @@ echo "Starting ..."
 set -eu
 
 FUNCTIONS_DIR="/app/serverless/tasks"
+# Modules shared by every function (e.g. transport.py); each image builds from its own directory
+COMMON_DIR="/app/serverless/common"
 
 export DOCKER_BUILDKIT=1
 
@@ -14,6 +16,8 @@ do
     echo "func_config", $func_config
     echo "func_root", $func_root
 
+    cp "$COMMON_DIR"/*.py "$func_root"/
+
     echo "Deploying $func_root function..."
     nuctl deploy --project-name default --path "$func_root" \
         --file "$func_config" --platform local --verbose
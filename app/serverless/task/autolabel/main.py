@@ -1,11 +1,7 @@
-import io
-import base64
 import json
 
-import cv2
-import numpy as np
-
 from app.serverless.task.autolabel.test import AutoLabel_FLorence2
+from transport import decode_request
 
 def init_context(context):
     context.logger.info("Init VLM model")
@@ -15,10 +11,8 @@ def init_context(context):
 
 def handler(context, event):
     context.logger.info("Run  model")
-    data = event.body
-    text = data.get('text', "")
-    image_buffer = io.BytesIO(base64.b64decode(data['image']))
-    image = cv2.imdecode(np.frombuffer(image_buffer.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+    image, params = decode_request(event)
+    text = params.get('text', "")
     # Extract features
     label = context.user_data.model_handler.label_image(image, text = text)
     
@@ -6,9 +6,9 @@ import numpy as np
 from PIL import Image
     
 class ImageFeatureExtractor:
-    def __init__(self):
+    def __init__(self, batch_size=16):
         #self.onnx_model = OnnxClip(batch_size=16, cache_dir="onnx_clip/data")
-        self.onnx_model = OnnxClip(batch_size=16, cache_dir=".cache")
+        self.onnx_model = OnnxClip(batch_size=batch_size, cache_dir=".cache")
         
     def extract_features_clip(self, image: Image):
         """Extract features from an image using CLIP model."""
@@ -23,8 +23,39 @@ class ImageFeatureExtractor:
         
         return normalized_features
     
+    def extract_features_clip_batch(self, images):
+        """Extract features from many images, running the CLIP model `batch_size` images at a time.
+
+        Returns an array of shape (len(images), embedding_size) with one L2-normalised row per image.
+        """
+        image_features = self.onnx_model.get_image_embeddings([np.array(image) for image in images])
+        norm = np.linalg.norm(image_features, axis=-1, keepdims=True)
+        image_features /= np.maximum(norm, 1e-12)
+        return image_features
+
     def features_to_string(self, features_array):
         features_string = np.array2string(features_array, separator=',', max_line_width=np.inf, floatmode='maxprec').strip('[]')
         return features_string
 
 
+
+
+class FeatureBatch:
+    """Collects images from several owners, embeds them in shared CLIP runs and scatters the vectors back.
+
+    Owners are any hashable key, e.g. the Qdrant point id of a whole image or of a crop.
+    """
+    def __init__(self):
+        self.keys = []
+        self.images = []
+
+    def add(self, key, image):
+        self.keys.append(key)
+        self.images.append(image)
+
+    def __len__(self):
+        return len(self.images)
+
+    def run(self, extractor: ImageFeatureExtractor):
+        features = extractor.extract_features_clip_batch(self.images)
+        return {key: feature.tolist() for key, feature in zip(self.keys, features)}
@@ -1,11 +1,7 @@
-import io
-import base64
 import json
 
-import cv2
-import numpy as np
-
 from image_feature import ImageFeatureExtractor
+from transport import decode_request
 
 def init_context(context):
     context.logger.info("Init CLIP model")
@@ -15,9 +11,7 @@ def init_context(context):
 
 def handler(context, event):
     context.logger.info("Run CLIP model")
-    data = event.body
-    image_buffer = io.BytesIO(base64.b64decode(data['image']))
-    image = cv2.imdecode(np.frombuffer(image_buffer.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+    image, _ = decode_request(event)
 
     # Extract features
     features = context.user_data.model_handler.extract_features_clip(image)
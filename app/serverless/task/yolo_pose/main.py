@@ -1,10 +1,7 @@
-import io
-import base64
 import json
 
-import cv2
-import numpy as np
 from yolo_det import YOLOposeWarp, warp_image
+from transport import decode_request
 
 # Initialize your model
 def init_context(context):
@@ -16,10 +13,9 @@ def init_context(context):
 # Inference endpoint
 def handler(context, event):
 	context.logger.info('Run custom yolov8 model')
-	data = event.body
-	threshold = data.get('threshold', 0.6)
-	image_buffer = io.BytesIO(base64.b64decode(data['image']))
-	image = cv2.imdecode(np.frombuffer(image_buffer.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+	image, params = decode_request(event)
+	# Header params arrive as strings
+	threshold = float(params.get('threshold', 0.6))
 
 	kpts, cls = context.user_data.model_handler.detector(image, conf_thres=threshold)
 
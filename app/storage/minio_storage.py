@@ -1,11 +1,63 @@
 from minio import Minio #type: ignore
 from minio.error import S3Error #type: ignore
+import io
 import os 
+import json
+import time
+import math
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import urllib3 #type: ignore
+
+MiB = 1024 * 1024
+
+def public_read_policy(bucket_name):
+    return json.dumps({
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": "*",
+                "Action": ["s3:GetObject"],
+                "Resource": [f"arn:aws:s3:::{bucket_name}/*"]
+            }
+        ]
+    })
 
 class MinioClientWrapper:
-    def __init__(self, endpoint, access_key, secret_key, secure=False):
+    # Buckets already set up in this process, keyed by (endpoint, bucket, public_read).
+    _ready_buckets = set()
+    _ready_lock = threading.Lock()
+
+    def __init__(self, endpoint, access_key, secret_key, secure=False, max_connections=32):
         print(f"{endpoint}:9000", access_key, secret_key)
-        self.client = Minio(f"{endpoint}:9000", access_key=access_key, secret_key=secret_key, secure=secure)
+        self.endpoint = f"{endpoint}:9000"
+        # Size the connection pool for the upload/download thread pools instead of minio's default of 10.
+        http_client = urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=300, read=300),
+            maxsize=max_connections,
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
+        self.client = Minio(self.endpoint, access_key=access_key, secret_key=secret_key, secure=secure,
+                            http_client=http_client)
+
+    def ensure_bucket(self, bucket_name, public_read=True):
+        """Create the bucket and set its policy once per process; later calls make no request."""
+        public_key = (self.endpoint, bucket_name, True)
+        key = (self.endpoint, bucket_name, public_read)
+        if key in self._ready_buckets or public_key in self._ready_buckets:
+            return
+        with self._ready_lock:
+            if key in self._ready_buckets or public_key in self._ready_buckets:
+                return
+            if not self.client.bucket_exists(bucket_name):
+                self.client.make_bucket(bucket_name)
+            if public_read:
+                self.client.set_bucket_policy(bucket_name, public_read_policy(bucket_name))
+            self._ready_buckets.add(key)
 
     def list_buckets(self):
         buckets = self.client.list_buckets()
@@ -25,6 +77,38 @@ class MinioClientWrapper:
         except S3Error as exc:
             print("Error occurred:", exc)
 
+    def iter_object(self, bucket_name, object_name, chunk_size=MiB, offset=0, length=0):
+        """Yield the object (or the byte range `offset`..`offset + length`) in chunks of `chunk_size`."""
+        response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    def read_object(self, bucket_name, object_name, offset=0, length=0):
+        """Read the object (or a byte range of it) into memory, without touching local disk.
+
+        Returns an io.BytesIO, so callers can decode it directly or take `getbuffer()` for a memoryview.
+        """
+        try:
+            response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+            try:
+                return io.BytesIO(response.read())
+            finally:
+                response.close()
+                response.release_conn()
+        except S3Error as exc:
+            print("Error occurred:", exc)
+
+    def get_many(self, bucket_name, object_names, max_workers=8, offset=0, length=0):
+        """Read many objects with a bounded thread pool; returns {object_name: BytesIO or None}."""
+        object_names = list(object_names)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            buffers = executor.map(lambda name: self.read_object(bucket_name, name, offset, length), object_names)
+            return dict(zip(object_names, buffers))
+
     def get_url_object(self, bucket_name, object_name):
         try:
             url = self.client.presigned_get_object(bucket_name, object_name)
@@ -32,15 +116,96 @@ class MinioClientWrapper:
         except S3Error as exc:
             print("Error occurred:", exc)
 
+    @staticmethod
+    def get_path_object(bucket_name, object_name):
+        """Build the `/bucket/object` path of an object locally, as found in its URL."""
+        return f"/{bucket_name}/{quote(object_name)}"
+
     def upload_object(self, bucket_name, object_name, file_path):
         try:
-            found = self.client.bucket_exists(bucket_name)
-            if not found:
-                self.client.make_bucket(bucket_name)
+            self.ensure_bucket(bucket_name, public_read=False)
             self.client.fput_object(bucket_name, object_name, file_path)
         except S3Error as exc:
             print("Error occurred:", exc)
 
+    @staticmethod
+    def choose_part_size(size):
+        """Pick a multipart part size: a single PUT for small objects, few large parts for big ones."""
+        if size <= 1024 * MiB:
+            return 16 * MiB
+        if size <= 16 * 1024 * MiB:
+            return 64 * MiB
+        # Stay below S3's limit of 10000 parts, rounded up to whole MiB.
+        return max(128 * MiB, math.ceil(size / 10000 / MiB) * MiB)
+
+    @staticmethod
+    def compute_etag(file_path, part_size):
+        """ETag MinIO reports for a file uploaded with `part_size`: its MD5, or the multipart MD5-of-MD5s."""
+        size = os.path.getsize(file_path)
+        digests = []
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(part_size)
+                if not chunk:
+                    break
+                digests.append(hashlib.md5(chunk).digest())
+        if size <= part_size:
+            return digests[0].hex() if digests else hashlib.md5(b"").hexdigest()
+        return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+    def _is_uploaded(self, bucket_name, object_name, file_path, size, part_size):
+        try:
+            stat = self.client.stat_object(bucket_name, object_name)
+        except S3Error:
+            return False
+        if stat.size != size:
+            return False
+        return (stat.etag or "").strip('"') == self.compute_etag(file_path, part_size)
+
+    def _upload_one(self, bucket_name, object_name, file_path, skip_existing):
+        result = {"object_name": object_name, "file_path": file_path, "status": "uploaded", "size": 0,
+                  "seconds": 0.0, "error": None}
+        start = time.perf_counter()
+        try:
+            size = os.path.getsize(file_path)
+            part_size = self.choose_part_size(size)
+            result["size"] = size
+            if skip_existing and self._is_uploaded(bucket_name, object_name, file_path, size, part_size):
+                result["status"] = "skipped"
+            else:
+                self.client.fput_object(bucket_name, object_name, file_path, part_size=part_size)
+        except (S3Error, OSError, ValueError) as exc:
+            result["status"] = "failed"
+            result["error"] = str(exc)
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def upload_many(self, bucket_name, items, max_workers=8, skip_existing=True):
+        """Upload (object_name, file_path) pairs with a bounded thread pool.
+
+        Objects whose size and ETag already match the local file are skipped. Returns one result dict
+        per item, in input order, with its status ("uploaded", "skipped" or "failed"), size and time.
+        """
+        self.ensure_bucket(bucket_name, public_read=False)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._upload_one, bucket_name, object_name, file_path, skip_existing)
+                for object_name, file_path in items
+            ]
+            return [future.result() for future in futures]
+
+    def upload_directory(self, bucket_name, directory, prefix="", recursive=True, max_workers=8, skip_existing=True):
+        """Upload every file under `directory`, keyed by `prefix` + its path relative to the directory."""
+        items = []
+        for root, dirs, files in os.walk(directory):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                relative = os.path.relpath(file_path, directory).replace(os.sep, "/")
+                items.append((prefix + relative, file_path))
+            if not recursive:
+                break
+        return self.upload_many(bucket_name, items, max_workers=max_workers, skip_existing=skip_existing)
+
     def remove_object(self, bucket_name, object_name):
         try:
             self.client.remove_object(bucket_name, object_name)
@@ -51,4 +216,15 @@ class MinioClientWrapper:
         try:
             self.client.set_bucket_policy(bucket_name, policy)
         except S3Error as exc:
-            print("Error occurred:", exc)
\ No newline at end of file
+            print("Error occurred:", exc)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_minio_client(minio_config) -> MinioClientWrapper:
+    """Return a process-wide MinioClientWrapper for the given config."""
+    key = (minio_config['domain'], minio_config['user'])
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = MinioClientWrapper(minio_config['domain'], minio_config['user'], minio_config['password'])
+        return _clients[key]
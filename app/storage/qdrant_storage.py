@@ -0,0 +1,84 @@
+import time
+import threading
+from collections import defaultdict
+
+from qdrant_client import QdrantClient #type: ignore
+
+
+class QdrantPointBuffer:
+    """Accumulates points per collection and writes them to Qdrant in large batches.
+
+    A collection is flushed when it holds `max_points` points or its oldest point is older than
+    `max_age` seconds (checked whenever points are added). Points stay buffered until Qdrant
+    acknowledges them, so a failed flush is retried on the next add, flush or close.
+    """
+    def __init__(self, client: QdrantClient, max_points=1024, max_age=5.0, batch_size=256, parallel=1, max_retries=3):
+        self.client = client
+        self.max_points = max_points
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.parallel = parallel
+        self.max_retries = max_retries
+        self._points = defaultdict(list)
+        self._first_added = {}
+        self._lock = threading.Lock()
+
+    def add(self, collection_name, points):
+        if not points:
+            return
+        with self._lock:
+            self._points[collection_name].extend(points)
+            self._first_added.setdefault(collection_name, time.monotonic())
+            due = self._is_due(collection_name)
+        if due:
+            try:
+                self.flush(collection_name)
+            except Exception as e:
+                print(f"An error occurred while flushing {collection_name} to Qdrant, points kept for retry: {e}")
+
+    def _is_due(self, collection_name):
+        age = time.monotonic() - self._first_added[collection_name]
+        return len(self._points[collection_name]) >= self.max_points or age >= self.max_age
+
+    def pending(self, collection_name=None):
+        with self._lock:
+            if collection_name is not None:
+                return len(self._points[collection_name])
+            return sum(len(points) for points in self._points.values())
+
+    def flush(self, collection_name=None):
+        """Upload buffered points; on failure they are put back in front of anything added meanwhile."""
+        with self._lock:
+            names = [collection_name] if collection_name is not None else list(self._points)
+        for name in names:
+            with self._lock:
+                points = self._points.pop(name, [])
+                self._first_added.pop(name, None)
+            if not points:
+                continue
+            try:
+                self.client.upload_points(
+                    collection_name=name,
+                    points=points,
+                    batch_size=self.batch_size,
+                    parallel=self.parallel,
+                    max_retries=self.max_retries,
+                    wait=True
+                )
+            except Exception:
+                with self._lock:
+                    self._points[name] = points + self._points[name]
+                    self._first_added[name] = time.monotonic()
+                raise
+
+    def close(self, attempts=3, backoff=1.0):
+        """Flush everything, retrying with exponential backoff; raises if points are still pending."""
+        for attempt in range(attempts):
+            try:
+                self.flush()
+                return
+            except Exception as e:
+                print(f"An error occurred while flushing to Qdrant (attempt {attempt + 1}/{attempts}): {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(backoff * 2 ** attempt)
+        raise RuntimeError(f"{self.pending()} points could not be written to Qdrant")
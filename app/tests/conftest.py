@@ -0,0 +1,18 @@
+import os
+import sys
+import importlib.util
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules import each other relative to app/ (`from configure import Config`).
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture(scope="session")
+def invoke_serverless():
+    """app/invoke-serverless.py, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location("invoke_serverless", os.path.join(APP_DIR, "invoke-serverless.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine, select #type: ignore
+
+import database.models as models
+from database.bulk_writer import BulkWriter
+
+
+def test_label_id_inserts_and_reads_back_label():
+    engine = create_engine("sqlite://")
+    models.Label.__table__.create(engine)
+    writer = BulkWriter(engine=engine)
+
+    label_id = writer.label_id("person")
+
+    with engine.connect() as conn:
+        rows = conn.execute(select(models.Label.id, models.Label.class_name)).all()
+    assert rows == [(label_id, "person")]
+    # A second writer finds the existing row instead of inserting another one.
+    assert BulkWriter(engine=engine).label_id("person") == label_id
+    assert writer.label_id("car") != label_id
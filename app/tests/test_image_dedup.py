@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine #type: ignore
+from sqlalchemy.orm import Session #type: ignore
+
+import database.models as models
+from etl.image_dedup import DedupIndex
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    models.ImageHash.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def link_rows(session):
+    return session.query(models.ImageHash).filter(models.ImageHash.is_duplicate.is_(True)).count()
+
+
+def test_rerun_does_not_link_a_duplicate_again(session):
+    original = uuid.uuid4()
+    index = DedupIndex(session)
+    index.add(original, "a" * 64, 0b1010, "/data/a.jpg")
+    index.flush()
+
+    for _ in range(2):  # the same folder ingested twice
+        index = DedupIndex(session)
+        kind, image_id, distance = index.lookup("b" * 64, 0b1011)
+        index.link(image_id, "b" * 64, 0b1011, "/data/b.jpg", distance)
+        index.link(image_id, "b" * 64, 0b1011, "/data/b.jpg", distance)
+        index.flush()
+
+    assert (kind, image_id) == ("near", original)
+    assert link_rows(session) == 1
+
+
+def test_discarded_link_can_be_added_again(session):
+    index = DedupIndex(session)
+    original = uuid.uuid4()
+    mark = index.mark()
+    index.link(original, "b" * 64, 1, "/data/b.jpg", 1)
+    index.discard_pending(mark)
+    index.link(original, "b" * 64, 1, "/data/b.jpg", 1)
+    index.flush()
+
+    assert link_rows(session) == 1
+
+
+def test_lookup_finds_exact_and_near_duplicates(session):
+    original, other = uuid.uuid4(), uuid.uuid4()
+    index = DedupIndex(session, max_distance=4)
+    index.add(original, "a" * 64, 0xFFFF_0000_FFFF_0000, "/data/a.jpg")  # high bit set: stored signed
+    index.add(other, "c" * 64, 0x0000_FFFF_0000_FFFF, "/data/c.jpg")
+    index.flush()
+
+    index = DedupIndex(session, max_distance=4)
+    assert index.lookup("a" * 64, 0) == ("exact", original, 0)
+    assert index.lookup("b" * 64, 0xFFFF_0000_FFFF_000F) == ("near", original, 4)
+    assert index.lookup("b" * 64, 0xFFFF_0000_FFFF_001F) is None  # distance 5
+
+
+def test_lookup_sees_pending_hashes_until_discarded(session):
+    index = DedupIndex(session)
+    mark = index.mark()
+    pending = uuid.uuid4()
+    index.add(pending, "a" * 64, 0b1111, "/data/a.jpg")
+
+    assert index.lookup("a" * 64, 0) == ("exact", pending, 0)
+    assert index.lookup("b" * 64, 0b0111) == ("near", pending, 1)
+
+    index.discard_pending(mark)
+    assert index.lookup("a" * 64, 0b1111) is None
+    index.flush()
+    assert session.query(models.ImageHash).count() == 0
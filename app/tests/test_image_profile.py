@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+
+def test_restore_scales_keypoints_by_declared_layout(invoke_serverless):
+    profile = invoke_serverless.ImageProfile(max_side=640, coordinate_keys=("keypoints",), point_dims=3)
+    _, scale = profile.resize(np.zeros((960, 1280, 3), dtype=np.uint8))
+    assert scale == (2.0, 2.0)
+
+    # One person with two (x, y, conf) keypoints, nested and flat: confidences are kept.
+    response = {"keypoints": [[[10, 20, 0.9], [30, 40, 0.5]]], "flat": [1, 2], "class": [0]}
+    restored = profile.restore(response, scale)
+    assert restored["keypoints"] == [[[20, 40, 0.9], [60, 80, 0.5]]]
+    assert profile.restore({"keypoints": [10, 20, 0.9, 30, 40, 0.5]}, scale)["keypoints"] == [20, 40, 0.9, 60, 80, 0.5]
+    assert restored["flat"] == [1, 2] and restored["class"] == [0]
+
+
+def test_restore_scales_boxes_with_two_dims(invoke_serverless):
+    profile = invoke_serverless.ImageProfile(coordinate_keys=("boxes",))
+    assert profile.restore([{"boxes": [1, 1, 3, 3]}], (2.0, 0.5)) == [{"boxes": [2.0, 0.5, 6.0, 1.5]}]
+
+
+def test_restore_rejects_lists_not_matching_the_layout(invoke_serverless):
+    profile = invoke_serverless.ImageProfile(coordinate_keys=("keypoints",), point_dims=3)
+    with pytest.raises(ValueError):
+        profile.restore({"keypoints": [10, 20, 30, 40]}, (2.0, 2.0))
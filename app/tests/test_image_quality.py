@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from etl.image_quality import BatchImageMetrics, ImageMetrics
+
+
+def make_image(rng, width, height, mode):
+    gradient = np.linspace(0, 255 * rng.random(), width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 30, (height, width, 3)).astype(np.float32)
+    return Image.fromarray(np.clip(gradient + noise, 0, 255).astype(np.uint8)).convert(mode)
+
+
+def assert_matches_loop(result, images):
+    for row, image in zip(result, images):
+        expected = ImageMetrics.calculate(image)
+        for field in BatchImageMetrics.FIELDS:
+            assert row[field] == pytest.approx(expected[field], rel=0, abs=1e-12), field
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_stack_matches_image_metrics(mode, monkeypatch):
+    rng = np.random.default_rng(0)
+    images = [make_image(rng, 64, 48, mode) for _ in range(40)]
+    images.append(Image.new(mode, (64, 48)))  # a constant image: zero entropy and variance
+
+    # A small chunk size so the stack is scored over several chunks.
+    monkeypatch.setattr(BatchImageMetrics, "MAX_PIXELS_PER_CHUNK", 64 * 48 * 16)
+    result = BatchImageMetrics.calculate(np.stack([np.asarray(image) for image in images]))
+
+    assert_matches_loop(result, images)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_mixed_sizes_keep_input_order(mode):
+    rng = np.random.default_rng(1)
+    # 200x120 and 90x300 go through the thumbnail path of the blur score, 2x2 has no inner pixels.
+    sizes = [(64, 64), (200, 120), (2, 2), (64, 64), (90, 300), (200, 120)]
+    images = [make_image(rng, width, height, mode) for width, height in sizes]
+
+    assert_matches_loop(BatchImageMetrics.calculate(images), images)
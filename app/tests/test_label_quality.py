@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+from cleanlab.object_detection.rank import get_label_quality_scores #type:ignore
+
+from etl.label_quality import CleanLabObjectDetection, IMAGE_EXTENSIONS, index_folder
+
+NUM_IMAGES = 40
+SHARD_SIZE = 10
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """Folders (images, labels, predictions) whose smallest box similarity is only in the first shard."""
+    root = tmp_path_factory.mktemp("label_quality")
+    folders = [str(root / name) for name in ("images", "labels", "predictions")]
+    for folder in folders:
+        os.makedirs(folder)
+    image_folder, label_folder, predict_folder = folders
+    rng = np.random.default_rng(1)
+    for i in range(NUM_IMAGES):
+        Image.new("RGB", (640, 480)).save(os.path.join(image_folder, f"{i:03d}.jpg"))
+        x, y = rng.uniform(0.3, 0.7, 2)
+        # Empty labels count as a zero-size box at the origin; their similarity to a prediction
+        # shrinks with the distance (and is ignored once it underflows to 0).
+        if i < 3:  # the dataset minimum, about 1e-12
+            label, prediction = "", "1 0.3125 0.3125 0.094 0.125 0.95\n"
+        elif 25 <= i < 28:  # the third shard's own minimum, about 1e-7
+            label, prediction = "", "1 0.156 0.208 0.094 0.125 0.95\n"
+        else:
+            label, prediction = f"0 {x:.3f} {y:.3f} 0.2 0.2\n", f"0 {x + 0.01:.3f} {y:.3f} 0.2 0.2 0.9\n"
+        with open(os.path.join(label_folder, f"{i:03d}.txt"), "w") as f:
+            f.write(label)
+        with open(os.path.join(predict_folder, f"{i:03d}.txt"), "w") as f:
+            f.write(prediction)
+    return label_folder, predict_folder, image_folder
+
+
+def cleanlab_scores(dataset, stems):
+    label_folder, predict_folder, image_folder = dataset
+    detector = CleanLabObjectDetection()
+    images = index_folder(image_folder, IMAGE_EXTENSIONS)
+    labels = detector.load_labels(label_folder, image_folder, stems, images, empty_placeholder=True)
+    predictions = detector.load_predictions(image_folder, predict_folder, 2, stems, images)
+    return get_label_quality_scores(labels, predictions, verbose=False)
+
+
+@pytest.mark.parametrize("shard_size", [None, SHARD_SIZE])
+def test_score_images_matches_cleanlab(dataset, shard_size):
+    label_folder, predict_folder, image_folder = dataset
+    images = index_folder(image_folder, IMAGE_EXTENSIONS)
+    stems = sorted(images)
+
+    scores = CleanLabObjectDetection().score_images(label_folder, predict_folder, image_folder, 2, stems, images,
+                                                    shard_size=shard_size, max_workers=2)
+
+    np.testing.assert_allclose(scores, cleanlab_scores(dataset, stems), rtol=1e-12, atol=0)
+
+
+def test_shard_scored_alone_differs(dataset):
+    # Guards the fixture: without the dataset-wide minimum, the shard of empty labels scores differently.
+    stems = sorted(index_folder(dataset[2], IMAGE_EXTENSIONS))
+    shard = stems[2 * SHARD_SIZE:3 * SHARD_SIZE]
+    assert not np.allclose(cleanlab_scores(dataset, shard), cleanlab_scores(dataset, stems)[2 * SHARD_SIZE:3 * SHARD_SIZE])
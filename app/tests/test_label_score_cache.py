@@ -0,0 +1,79 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from etl.label_score_cache import LabelScoreCache
+
+STEMS = ["img0", "img1"]
+SIZES = np.array([[640, 480], [1280, 720]])
+
+
+@pytest.fixture
+def folders(tmp_path):
+    labels, predicts = tmp_path / "labels", tmp_path / "predicts"
+    labels.mkdir()
+    predicts.mkdir()
+    for stem in STEMS:
+        (labels / f"{stem}.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+        (predicts / f"{stem}.txt").write_text("0 0.5 0.5 0.2 0.2 0.9\n")
+    return labels, predicts
+
+
+def stored_cache(tmp_path, folders, scorer_version="2.9.0"):
+    cache = LabelScoreCache(str(tmp_path / "cache" / "scores.sqlite"), scorer_version=scorer_version)
+    keys = cache.keys(str(folders[0]), str(folders[1]), STEMS, SIZES)
+    cache.store(keys, 3, STEMS, np.array([0.1, 0.2]), 0.05, np.array([0.7, 0.8]))
+    return cache
+
+
+def test_unchanged_keys_hit(tmp_path, folders):
+    cache = stored_cache(tmp_path, folders)
+    keys = cache.keys(str(folders[0]), str(folders[1]), STEMS, SIZES)
+
+    assert keys["img1"][2] == "1280x720"
+    assert cache.lookup(keys, 3) == {"img0": (0.1, 0.05, 0.7), "img1": (0.2, 0.05, 0.8)}
+
+
+@pytest.mark.parametrize("change", ["label", "predict", "size"])
+def test_changed_file_or_size_misses_only_that_image(tmp_path, folders, change):
+    cache = stored_cache(tmp_path, folders)
+    sizes = SIZES.copy()
+    if change == "label":
+        (folders[0] / "img0.txt").write_text("1 0.5 0.5 0.2 0.2\n")
+    elif change == "predict":
+        (folders[1] / "img0.txt").unlink()
+    else:
+        sizes[0] = [480, 640]
+
+    keys = cache.keys(str(folders[0]), str(folders[1]), STEMS, sizes)
+    assert set(cache.lookup(keys, 3)) == {"img1"}
+
+
+def test_num_classes_and_scorer_version_are_part_of_the_key(tmp_path, folders):
+    cache = stored_cache(tmp_path, folders)
+    keys = cache.keys(str(folders[0]), str(folders[1]), STEMS, SIZES)
+    assert cache.lookup(keys, 4) == {}
+    cache.close()
+
+    upgraded = LabelScoreCache(cache.db_path, scorer_version="2.10.0")
+    assert upgraded.lookup(keys, 3) == {}
+
+
+def test_missing_and_empty_label_files_share_a_key(tmp_path, folders):
+    cache = stored_cache(tmp_path, folders)
+    (folders[0] / "img0.txt").unlink()
+    missing = cache.keys(str(folders[0]), str(folders[1]), STEMS, SIZES)
+    (folders[0] / "img0.txt").write_text("")
+    assert cache.keys(str(folders[0]), str(folders[1]), STEMS, SIZES) == missing
+
+
+def test_table_of_an_older_layout_is_dropped(tmp_path):
+    db_path = str(tmp_path / "scores.sqlite")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE label_score (stem TEXT PRIMARY KEY, score REAL)")
+        conn.execute("INSERT INTO label_score VALUES ('img0', 0.5)")
+    conn.close()
+
+    cache = LabelScoreCache(db_path)
+    assert cache.conn.execute("SELECT COUNT(*) FROM label_score").fetchone() == (0,)
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+import utils.manifest
+from utils.manifest import IngestManifest, file_sha256
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        (tmp_path / name).write_bytes(name.encode() * 10)
+    return tmp_path
+
+
+def items(folder):
+    return [(str(folder / name), name) for name in ["a.jpg", "b.jpg", "c.jpg"]]
+
+
+def test_rerun_resumes_after_the_last_recorded_files(folder, tmp_path):
+    manifest_path = str(tmp_path / "manifests" / "run.jsonl")
+    manifest = IngestManifest(manifest_path)
+    pending, processed = manifest.plan(items(folder))
+    assert len(pending) == 3 and processed == []
+
+    done = [file_path for file_path, _ in pending[:2]]
+    manifest.mark_done({file_path: file_sha256(file_path) for file_path in done})
+
+    pending, processed = IngestManifest(manifest_path).plan(items(folder))
+    assert [file_path for file_path, _ in processed] == done
+    assert [name for _, name in pending] == ["c.jpg"]
+
+
+def test_touched_files_are_checked_by_content(folder, tmp_path):
+    manifest = IngestManifest(str(tmp_path / "run.jsonl"))
+    manifest.mark_done({file_path: file_sha256(file_path) for file_path, _ in items(folder)})
+    touched, modified = str(folder / "a.jpg"), str(folder / "b.jpg")
+    os.utime(touched, (1, 1))
+    with open(modified, "r+b") as f:
+        f.write(b"B")  # same size, new content
+    os.utime(modified, (1, 1))
+
+    pending, processed = IngestManifest(manifest.manifest_path).plan(items(folder))
+    assert [name for _, name in pending] == ["b.jpg"]
+    assert [name for _, name in processed] == ["a.jpg", "c.jpg"]
+
+
+def test_mark_done_records_the_callers_digest(folder, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.manifest, "file_sha256", lambda file_path: pytest.fail("file hashed again"))
+    manifest = IngestManifest(str(tmp_path / "run.jsonl"))
+    manifest.mark_done({str(folder / "a.jpg"): "d" * 64})
+
+    entry = IngestManifest(manifest.manifest_path).entries[str(folder / "a.jpg")]
+    assert entry["sha256"] == "d" * 64
+
+
+def test_partial_last_line_and_compaction(folder, tmp_path):
+    manifest_path = str(tmp_path / "run.jsonl")
+    manifest = IngestManifest(manifest_path)
+    digests = {str(folder / "a.jpg"): file_sha256(str(folder / "a.jpg"))}
+    for _ in range(1003):
+        manifest.mark_done(digests)
+    with open(manifest_path, "a") as f:
+        f.write('{"path": "/data/crash')  # killed while writing
+
+    reloaded = IngestManifest(manifest_path)
+    assert list(reloaded.entries) == list(digests)
+    with open(manifest_path) as f:
+        assert len(f.readlines()) == 1
@@ -0,0 +1,49 @@
+import queue
+
+from utils.utils import PoolResults
+
+
+class Worker:
+    """A worker process that exits after `alive_checks` calls to is_alive()."""
+    def __init__(self, alive_checks):
+        self.alive_checks = alive_checks
+
+    def is_alive(self):
+        self.alive_checks -= 1
+        return self.alive_checks >= 0
+
+
+class Manifest:
+    def __init__(self):
+        self.done = {}
+
+    def mark_done(self, digests):
+        self.done.update(digests)
+
+
+def test_results_left_after_workers_exit_are_drained():
+    results_queue = queue.Queue()
+    results_queue.put((["/a.jpg", "/b.jpg"], {}, {"decode": 1.0}, None))
+    results_queue.put((["/c.jpg"], {}, {"decode": 0.5}, "OSError('truncated')"))
+    # The final checkpoint of a worker that has already exited.
+    results_queue.put(([], {"/a.jpg": "a" * 64, "/b.jpg": "b" * 64}, {}, None))
+    manifest = Manifest()
+    results = PoolResults(manifest)
+
+    results.drain(results_queue, [Worker(alive_checks=0)], timeout=0.01)
+
+    assert manifest.done == {"/a.jpg": "a" * 64, "/b.jpg": "b" * 64}
+    assert results.written == {"/a.jpg", "/b.jpg"} and results.failed == {"/c.jpg"}
+    assert results.timer.totals == {"decode": 1.5}
+    assert results.lost(["/a.jpg", "/b.jpg", "/c.jpg", "/d.jpg"]) == {"/d.jpg"}
+
+
+def test_drain_waits_for_running_workers():
+    results_queue = queue.Queue()
+    workers = [Worker(alive_checks=3), Worker(alive_checks=1)]
+    results = PoolResults()
+
+    results.drain(results_queue, workers, timeout=0.01)
+
+    assert all(worker.alive_checks < 0 for worker in workers)  # both were seen exited
+    assert results.written == set() and results.lost(["/a.jpg"]) == {"/a.jpg"}
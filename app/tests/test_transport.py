@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from serverless.common.transport import decode_request
+
+FUNCTION = {"metadata": {"name": "test-detector", "annotations": {"type": "detector"}}, "spec": {"description": ""}}
+
+
+class RecordingGateway:
+    """Keeps the last invocation and answers it with an empty detection list."""
+    def invoke(self, func, payload, body=None, headers=None, retries=True):
+        self.request = SimpleNamespace(headers=headers or {}, body=body if body is not None else payload)
+        return []
+
+
+class Registry:
+    """FunctionRegistry serving one parsed spec without a dashboard."""
+    def __init__(self, spec):
+        self.spec = spec
+
+    def get(self, function_name):
+        return self.spec
+
+
+@pytest.fixture
+def make_function(invoke_serverless):
+    registry = Registry(invoke_serverless.LambdaFunction.parse_function(FUNCTION))
+
+    def make(transport, profile=None):
+        gateway = RecordingGateway()
+        return gateway, invoke_serverless.LambdaFunction(gateway, "test-detector", transport=transport,
+                                                         profile=profile, registry=registry)
+    return make
+
+
+@pytest.mark.parametrize("transport", ["json", "binary", "msgpack"])
+def test_decode_request_reads_every_transport(make_function, transport):
+    image = np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8)
+    gateway, function = make_function(transport)
+
+    function.invoke({"image": image, "threshold": 0.25})
+    decoded, params = decode_request(gateway.request)
+
+    assert decoded.shape == image.shape
+    assert float(params["threshold"]) == 0.25
+
+
+def test_binary_transport_sends_the_profile_format(make_function, invoke_serverless):
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    gateway, function = make_function("binary", invoke_serverless.ImageProfile(encode_format=".webp", quality=80))
+
+    function.invoke({"image": image})
+
+    assert gateway.request.headers["Content-Type"] == "image/webp"
+    assert gateway.request.body[8:12] == b"WEBP"
+    assert decode_request(gateway.request)[0].shape == image.shape
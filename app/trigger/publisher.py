@@ -1,14 +1,16 @@
 import os
+import time
 import redis, json
 from etl.label_quality import CleanLabObjectDetection
 
-def process_and_publish(label_folder_path, predict_folder_path, image_folder_path, num_classes, threshold):
+def process_and_publish(label_folder_path, predict_folder_path, image_folder_path, num_classes, threshold, cache_path=None):
     processed_files = set()
 
     r = redis.Redis(host='localhost', port=6379, decode_responses=True)
     
     label_quality = CleanLabObjectDetection()
-    img_paths, label_paths, predict_paths = label_quality.clean_lap(label_folder_path, predict_folder_path, image_folder_path, num_classes, threshold)
+    img_paths, label_paths, predict_paths = label_quality.clean_lap(label_folder_path, predict_folder_path, image_folder_path, num_classes, threshold,
+                                                                  cache_path=cache_path)
     
     for img_path, label_path, predict_path in zip(img_paths, label_paths, predict_paths):
         if img_path in processed_files:
@@ -17,6 +19,7 @@ def process_and_publish(label_folder_path, predict_folder_path, image_folder_pat
             "image_path": img_path,
             "label_path": label_path,
             "predict_path": predict_path,
+            "sent_at": time.time(),
         })
         r.publish("file_differences", message)
         processed_files.add(img_path)
@@ -1,5 +1,10 @@
-import os, json
-import redis
+import os, json, time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import redis.asyncio as aioredis
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CallbackQueryHandler, ContextTypes
 import asyncio
@@ -75,8 +80,15 @@ def merge_images(image1, image2, image3):
     
     return new_image
 
-def process_and_merge_images(image_path, label_path, predict_path):
-    image = Image.open(image_path).convert("RGB")
+def process_and_merge_images(image_path, label_path, predict_path, max_side=None):
+    image = Image.open(image_path)
+    if max_side:
+        # Ảnh xem trước: JPEG được giải mã ở độ phân giải nhỏ (draft), sau đó thu nhỏ về max_side
+        image.draft("RGB", (max_side, max_side))
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side))
+    else:
+        image = image.convert("RGB")
     size = image.size
     
     label_bboxes = read_bboxes(label_path)
@@ -94,12 +106,53 @@ def process_and_merge_images(image_path, label_path, predict_path):
     
     return merged_image
 
-click = True 
+# Số thông báo được gửi song song và số tin nhắn Redis tối đa chờ trong hàng đợi
+NOTIFY_WORKERS = int(os.environ.get("NOTIFY_WORKERS", 4))
+QUEUE_SIZE = int(os.environ.get("NOTIFY_QUEUE_SIZE", 100))
+# Thời gian chờ tối đa (giây) giữa các lần kết nối lại Redis, tăng gấp đôi từ 1 giây
+RECONNECT_BACKOFF_MAX = float(os.environ.get("NOTIFY_RECONNECT_BACKOFF_MAX", 30))
+
+logger = logging.getLogger(__name__)
+
+# Ảnh so sánh được vẽ ngoài event loop, ở kích thước xem trước, và được cache theo nội dung 3 file
+PREVIEW_MAX_SIDE = int(os.environ.get("NOTIFY_PREVIEW_MAX_SIDE", 1024))
+PREVIEW_FORMAT = os.environ.get("NOTIFY_PREVIEW_FORMAT", "JPEG")  # JPEG hoặc WEBP
+PREVIEW_QUALITY = int(os.environ.get("NOTIFY_PREVIEW_QUALITY", 85))
+RENDER_CACHE_SIZE = int(os.environ.get("NOTIFY_RENDER_CACHE_SIZE", 256))
+
+render_executor = ThreadPoolExecutor(max_workers=NOTIFY_WORKERS)
+_render_cache = OrderedDict()
+_render_lock = threading.Lock()
+
+def _files_digest(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def render_comparison(image_path, label_path, predict_path):
+    """Ảnh so sánh label / predict / diff đã mã hóa (bytes); chạy trong render_executor.
+
+    Kết quả được cache (LRU) theo hash nội dung của ảnh, label và predict, nên gửi lại cùng một
+    thông báo không phải vẽ lại.
+    """
+    key = (_files_digest(image_path, label_path, predict_path), PREVIEW_MAX_SIDE, PREVIEW_FORMAT, PREVIEW_QUALITY)
+    with _render_lock:
+        if key in _render_cache:
+            _render_cache.move_to_end(key)
+            return _render_cache[key]
+    merged_image = process_and_merge_images(image_path, label_path, predict_path, max_side=PREVIEW_MAX_SIDE)
+    image_byte_array = BytesIO()
+    merged_image.save(image_byte_array, format=PREVIEW_FORMAT, quality=PREVIEW_QUALITY)
+    data = image_byte_array.getvalue()
+    with _render_lock:
+        _render_cache[key] = data
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return data
 
 async def notify_difference(label_path, predict_path, image_path):
-    global click
-    click = False  
-    
     t = get_current_time()
     keyboard = [
         [
@@ -108,16 +161,13 @@ async def notify_difference(label_path, predict_path, image_path):
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    merged_image = process_and_merge_images(image_path, label_path, predict_path)
-    image_byte_array = BytesIO()
-    merged_image.save(image_byte_array, format='PNG')
-    image_byte_array.seek(0)
+    loop = asyncio.get_running_loop()
+    photo = await loop.run_in_executor(render_executor, render_comparison, image_path, label_path, predict_path)
 
-    await app.bot.send_photo(chat_id=chat_id, photo=image_byte_array, caption=f"🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴\n⏰⏰⏰TIME : {t}\n📋📋📋TASK: {predict_path.split('/')[-3]}\n", reply_markup=reply_markup)
+    await app.bot.send_photo(chat_id=chat_id, photo=photo, caption=f"🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴🔴\n⏰⏰⏰TIME : {t}\n📋📋📋TASK: {predict_path.split('/')[-3]}\n", reply_markup=reply_markup)
     
 
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    global click
     query = update.callback_query
     await query.answer()
     choice = query.data.split('+')[0]
@@ -130,33 +180,68 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     elif choice == 'Delete':
         await query.edit_message_caption(caption=f"🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵🔵\n⏰⏰⏰ TIME : {get_current_time()}\n📋📋📋 TASK : {task}\n❌❌❌Cancelled")
 
-    click = True 
-
-async def listen_to_redis():
-    pubsub = r.pubsub()
-    pubsub.subscribe("file_differences")
+async def listen_to_redis(queue: asyncio.Queue):
+    """Chờ tin nhắn Redis (không polling) và đưa vào hàng đợi; hàng đợi đầy thì dừng đọc cho tới khi có chỗ.
 
+    Pub/sub không có backpressure: khi listener dừng đọc, Redis giữ tin nhắn trong output buffer
+    của client và ngắt kết nối khi vượt `client-output-buffer-limit`. Mất kết nối thì listener
+    ghi log và kết nối lại với backoff tăng dần; tin nhắn publish trong lúc mất kết nối bị mất.
+    """
+    backoff = 1.0
+    while True:
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe("file_differences")
+            backoff = 1.0
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                try:
+                    data = json.loads(message['data'])
+                except ValueError as e:
+                    logger.warning("An error occurred while decoding a Redis message: %s", e)
+                    continue
+                await queue.put(data)
+            logger.warning("Redis subscription ended, reconnecting in %.0fs", backoff)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Redis listener lost its connection, reconnecting in %.0fs", backoff)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+async def notification_worker(queue: asyncio.Queue):
     while True:
-        if click:
-            message = pubsub.get_message()
-            if message and message['type'] == 'message':
-                data = json.loads(message['data'])
-                print(data)
-                predict_path = data['predict_path']
-                label_path = data['label_path']
-                image_path = data['image_path']
-                await notify_difference(label_path, predict_path, image_path)
-        await asyncio.sleep(1)  
+        data = await queue.get()
+        try:
+            await notify_difference(data['label_path'], data['predict_path'], data['image_path'])
+            if 'sent_at' in data:
+                logger.info("Notified %s in %.1f ms", data['image_path'], (time.time() - data['sent_at']) * 1000)
+        except Exception:
+            logger.exception("An error occurred while notifying %s", data)
+        finally:
+            queue.task_done()
+
+async def start_listener(application):
+    """post_init của bot: chạy listener Redis và các worker gửi thông báo trên event loop của bot."""
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    tasks = [asyncio.create_task(listen_to_redis(queue))]
+    tasks += [asyncio.create_task(notification_worker(queue)) for _ in range(NOTIFY_WORKERS)]
+    application.bot_data["listener_tasks"] = tasks  # giữ tham chiếu để task không bị thu hồi
 
 def main():
     app.add_handler(CallbackQueryHandler(button))
     app.run_polling()
 
 if __name__ == "__main__":
-    app = ApplicationBuilder().token("6404179839:AAG4fD_BieNzlXvYEHevWRI8z1_dixJz1wU").build()
-    r = redis.Redis(host='localhost', port=6379, decode_responses=True)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    app = ApplicationBuilder().token("6404179839:AAG4fD_BieNzlXvYEHevWRI8z1_dixJz1wU").post_init(start_listener).build()
+    r = aioredis.Redis(host='localhost', port=6379, decode_responses=True)
     chat_id = "-4245611864"
     processed_files = set()
-    loop = asyncio.get_event_loop()
-    loop.create_task(listen_to_redis())
     main()
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Checkpoint of the files a folder ingestion has already processed.
+
+    Stored as append-only JSON lines ({"path", "mtime", "size", "sha256"}), one per processed file,
+    so a crash loses at most the batch in flight. The last line for a path wins.
+    """
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entries = {}
+        lines = 0
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partially written last line
+                    self.entries[entry["path"]] = entry
+                    lines += 1
+        if lines > 2 * len(self.entries) + 1000:
+            self.compact()
+
+    def _is_processed(self, file_path):
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        if entry["size"] != stat.st_size:
+            return False
+        if entry["mtime"] == stat.st_mtime:
+            return True
+        # Touched but maybe not modified: fall back to the content hash.
+        return entry["sha256"] == file_sha256(file_path)
+
+    def plan(self, items):
+        """Split (file_path, file_name) items into (new or changed, already processed)."""
+        pending, processed = [], []
+        for item in items:
+            (processed if self._is_processed(item[0]) else pending).append(item)
+        return pending, processed
+
+    def mark_done(self, digests):
+        """Record processed files given as {file_path: sha256}.
+
+        The caller passes the digests it computed while reading the files, so nothing is read again here.
+        """
+        parent = os.path.dirname(self.manifest_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(self.manifest_path, "a") as f:
+            for file_path, sha256 in digests.items():
+                stat = os.stat(file_path)
+                entry = {
+                    "path": os.path.abspath(file_path),
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "sha256": sha256,
+                }
+                self.entries[entry["path"]] = entry
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.manifest_path)
+
+    def report(self, pending, processed):
+        return {
+            "to_process": len(pending),
+            "already_processed": len(processed),
+            "files": [file_path for file_path, _ in pending],
+        }
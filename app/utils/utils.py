@@ -1,6 +1,76 @@
-import os, datetime
+import os, datetime, time, queue
+from collections import defaultdict
+from contextlib import contextmanager
 import numpy as np
 
+class StageTimer:
+    """Accumulates wall-clock time per named stage of the ingestion pipeline."""
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def merge(self, totals):
+        for name, seconds in totals.items():
+            self.totals[name] += seconds
+
+    def report(self, num_images, elapsed):
+        """Return throughput in images/sec and mean per-image latency of each stage in milliseconds."""
+        return {
+            "images": num_images,
+            "elapsed_s": round(elapsed, 3),
+            "images_per_sec": round(num_images / elapsed, 3) if elapsed > 0 else 0.0,
+            "stage_ms": {
+                name: round(1000 * seconds / num_images, 3) if num_images else 0.0
+                for name, seconds in self.totals.items()
+            },
+        }
+
+class PoolResults:
+    """Collects the (file_paths, durable, totals, error) results sent by ingestion worker processes.
+
+    `durable` is {file_path: sha256} of the files whose data a worker has written; they are
+    recorded in `manifest` (if any). Files reported with an error are failed.
+    """
+    def __init__(self, manifest=None):
+        self.manifest = manifest
+        self.timer = StageTimer()
+        self.written, self.failed = set(), set()
+
+    def handle(self, result):
+        file_paths, durable, totals, error = result
+        self.timer.merge(totals)
+        if self.manifest is not None and durable:
+            self.manifest.mark_done(durable)
+        self.written.update(durable)
+        if error is not None:
+            self.failed.update(file_paths)
+            print(f"An error occurred while processing {file_paths}: {error}")
+
+    def drain(self, result_queue, workers, timeout=1.0):
+        """Handle results until every worker has exited, then those still in the queue."""
+        while any(worker.is_alive() for worker in workers):
+            try:
+                self.handle(result_queue.get(timeout=timeout))
+            except queue.Empty:
+                continue
+        # A worker's last results can still be in the queue after it exited.
+        while True:
+            try:
+                self.handle(result_queue.get(timeout=0.1))
+            except queue.Empty:
+                break
+
+    def lost(self, file_paths):
+        """Files neither acknowledged as written nor reported as failed, e.g. held by a crashed worker."""
+        return set(file_paths) - self.written - self.failed
+
 def get_file_download_date(file_path):
     file_stats = os.stat(file_path)
     access_time = file_stats.st_atime